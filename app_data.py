@@ -0,0 +1,160 @@
+"""
+The data the pages read, shared by every session of the server.
+
+The years are downloaded in the background and every page renders the ones
+loaded so far. The frames and cubes of a data version are built once per node,
+see data_service, and handed out read-only.
+"""
+import streamlit as st
+
+from ckan_client import RESOURCES
+from cube import build_cube
+from data_loader import SnapshotLoader
+from data_service import get_service, load_shared
+from dataset import build_heatmap_cube, load_analytics_frame
+from geometry import load_boundaries, prepare_boundaries
+from instrumentation import annotate, span
+from prerender import prerender_current
+from snapshot_store import data_version, start_background_refresh
+from timeseries import QuarterlySeries
+
+LOADING_POLL = 2  # seconds between reruns while years are still loading
+
+
+@st.cache_resource
+def start_loader():
+    # one loader per server process, sessions that start during a cold start
+    # wait on the same download
+    return SnapshotLoader().start()
+
+
+@st.cache_resource
+def start_refresh():
+    # one refresh thread per server process, shared by all sessions
+    # and the prerendering of every chart variant after each refresh
+    return start_background_refresh(on_change=prerender_current)
+
+
+def wait_for_data(loader, ready_count):
+    """
+    Waits a little for another year to load, then reruns the script so the
+    page fills in with it. Never returns.
+    :param loader: the snapshot loader
+    :param ready_count: number of years the page was rendered with
+    """
+    loader.wait(ready_count, timeout=LOADING_POLL)
+    st.rerun()
+
+
+def show_load_error(loader):
+    """
+    Tells that no year could be loaded and stops the script, instead of
+    rerunning it until one is. The failed years are downloaded again from the
+    button, or by a later rerun once the loader's backoff passed.
+    :param loader: the snapshot loader, done
+    """
+    st.error("לא ניתן היה לטעון את נתוני הפשיעה: "
+             + "; ".join(f"{year}: {error}" for year, error in sorted(loader.errors.items())))
+    if st.button("נסה שוב"):
+        loader.retry(backoff=0)
+        st.rerun()
+    st.stop()
+
+
+def load_version():
+    """
+    :return: (data version, tuple of years) of the years loaded so far. Before
+    the first year is loaded, the page is rerun until it is, or shows the error
+    if none could be.
+    """
+    loader = start_loader()
+    resources = loader.ready()
+    if loader.done() and loader.errors:
+        loader.retry()  # in the background, once the backoff passed
+    if not resources:
+        if loader.done():
+            show_load_error(loader)
+        wait_for_data(loader, 0)
+    if loader.done():
+        start_refresh()
+    return data_version(resources), tuple(resources)
+
+
+def load_analytics_data(version, years):
+    """
+    Builds the analytics-ready frame shared by every page, session and
+    process of the node. It is handed out without copying, so it must not be
+    modified.
+    :param version: the snapshot store's data version
+    :param years: the years loaded so far
+    :return: the analytics-ready pandas df of the years
+    """
+    resources = {year: RESOURCES[year] for year in years}
+    return load_shared("analytics", version, lambda: load_analytics_frame(resources))
+
+
+def load_cube_for_version(version, years):
+    """
+    :param version: the snapshot store's data version
+    :param years: the years loaded so far
+    :return: the count cube of the analytics-ready frame
+    """
+    return load_shared("cube", version, lambda: build_cube(load_analytics_data(version, years)))
+
+
+def load_heatmap_cube_for_version(version, years):
+    """
+    :param version: the snapshot store's data version
+    :param years: the years loaded so far
+    :return: count cube of the heatmap records by year, statistic group and Merhav,
+    with the MerhavCode of the boundary polygon every cell is joined to
+    """
+    return load_shared("heatmap_cube", version, lambda: build_heatmap_cube(
+        version, lambda: load_analytics_data(version, years), load_merhav_table()['MerhavName']
+    ))
+
+
+@st.cache_resource
+def _latest_series():
+    # the series of the newest data version, which the next one extends
+    return {}
+
+
+def load_series_for_version(version, years):
+    """
+    :param version: the snapshot store's data version
+    :param years: the years loaded so far
+    :return: the QuarterlySeries of the count cube, extended from the previous version's
+    """
+    latest = _latest_series()
+
+    def build():
+        series = QuarterlySeries.from_cube(load_cube_for_version(version, years), latest.get("series"))
+        latest["series"] = series
+        return series
+
+    return get_service().get("series", version, build)
+
+
+@st.cache_resource
+def load_merhav_table():
+    """
+    The app needs the polygons' ids and names only, their geometry is sent
+    to the browser as GeoJSON
+    :return: pandas df of the unique_id and MerhavName of every polygon, shared by all sessions
+    """
+    annotate(cache="miss")
+    return load_shared("merhav_table", prepare_boundaries(),
+                       lambda: load_boundaries()[['unique_id', 'MerhavName']])
+
+
+def show_figure(fig):
+    """
+    Sends a plotly figure to the browser, timing its serialization
+    :param fig: plotly figure
+    """
+    # serialized a second time for its size, with the developer panel only
+    size = len(fig.to_json()) if "dev" in st.query_params else None
+    with span("plotly_chart") as stage:
+        stage["bytes"] = size
+        st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the per-row .apply categorization that load_data used
+against the vectorized preprocessing.add_categories, on a synthetic frame.
+
+    python benchmarks/bench_categorize.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from mock_ckan import STATISTIC_GROUPS  # noqa: E402
+from preprocessing import add_categories  # noqa: E402
+
+
+def categorize_statistic_group(stat_group):
+    # the per-call dict and linear scan load_data used to run on every row
+    categories = {
+        "עבירות פליליות כלליות": ['עבירות כלפי הרכוש', 'עבירות נגד גוף', 'עבירות נגד אדם', 'עבירות מין'],
+        "עבירות מוסר וסדר ציבורי": ['עבירות כלפי המוסר', 'עבירות סדר ציבורי'],
+        "עבירות ביטחון": ['עבירות בטחון'],
+        "עבירות כלכליות ומנהליות": ['עבירות כלכליות', 'עבירות מנהליות', 'עבירות רשוי'],
+        "עבירות תנועה": ['עבירות תנועה'],
+        "עבירות מרמה": ['עבירות מרמה']
+    }
+    for category, types in categories.items():
+        if stat_group in types:
+            return category
+    return None
+
+
+def add_categories_apply(df):
+    df["Category"] = df["StatisticGroup"].apply(categorize_statistic_group)
+    df = df.dropna(subset=["Category"])
+    df["ReversedStatisticGroup"] = df["Category"].apply(lambda x: x[::-1])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # include a group that belongs to no category, like the real data has
+    groups = np.array(STATISTIC_GROUPS + ["עבירות אחרות"], dtype=object)
+    df = pd.DataFrame({"StatisticGroup": groups[rng.integers(0, len(groups), args.rows)]})
+
+    start = time.perf_counter()
+    before = add_categories_apply(df.copy())
+    apply_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    after = add_categories(df.copy())
+    vectorized_time = time.perf_counter() - start
+
+    assert before.index.equals(after.index)
+    assert (before["Category"] == after["Category"].astype(object)).all()
+    assert (before["ReversedStatisticGroup"] == after["ReversedStatisticGroup"].astype(object)).all()
+
+    print(f"{args.rows} rows")
+    print(f".apply:     {apply_time:.3f}s, {args.rows / apply_time:,.0f} rows/sec")
+    print(f"vectorized: {vectorized_time:.3f}s, {args.rows / vectorized_time:,.0f} rows/sec "
+          f"({apply_time / vectorized_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares the old sequential load (one request after another) with the
+concurrent, paginated ckan_client fetch, against a local mock CKAN server.
+
+    python benchmarks/bench_ingest.py --records 50000 --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from ckan_client import RESOURCES, fetch_page, fetch_records, make_session  # noqa: E402
+from mock_ckan import MockCkan, make_records  # noqa: E402
+
+
+def sequential_fetch(base_url, page_size):
+    """
+    Pages through the years one request at a time, like load_data used to
+    """
+    session = requests.Session()
+    result = {}
+    for year, resource_id in RESOURCES.items():
+        records, total = fetch_page(session, resource_id, 0, page_size, base_url)
+        offset = page_size
+        while offset < total:
+            records += fetch_page(session, resource_id, offset, page_size, base_url)[0]
+            offset += page_size
+        result[year] = records
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=50000, help="records per year")
+    parser.add_argument("--page-size", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request")
+    args = parser.parse_args()
+
+    resources = {resource_id: make_records(year, args.records) for year, resource_id in RESOURCES.items()}
+    with MockCkan(resources, latency=args.latency) as mock:
+        start = time.perf_counter()
+        sequential = sequential_fetch(mock.base_url, args.page_size)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = fetch_records(base_url=mock.base_url, page_size=args.page_size, session=make_session())
+        concurrent_time = time.perf_counter() - start
+
+    assert sequential == concurrent
+    total = sum(len(records) for records in concurrent.values())
+    print(f"{total} records, {args.page_size} per page, {args.latency}s latency")
+    print(f"sequential: {sequential_time:.2f}s")
+    print(f"concurrent: {concurrent_time:.2f}s ({sequential_time / concurrent_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
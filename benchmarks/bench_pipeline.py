@@ -0,0 +1,324 @@
+"""
+Times the dashboard's pipeline stage by stage on synthetic data of growing size.
+
+The records are shaped like the data.gov.il resources, split evenly between the
+years, and served by the local mock of datastore_search. Every scale runs in a
+fresh process, with the mock server in another one, so the time and memory of
+one scale don't leak into the next. The stages are:
+
+    fetch       download every page of every year, the bodies are dropped
+    parse       parse the pages into compact frames, one page at a time
+    categorize  add_categories per year and build_analytics_frame
+    aggregate   the count cube, the Oct-7 counts and the heatmap cube
+    figure      the overview, Oct-7 and map figures of all the data
+    serialize   the overview PNG and the plotly JSON of the others
+
+In the app fetch and parse overlap, as every page is parsed while it streams
+in. Peak memory is the process's resident memory, sampled during every stage.
+The JSON report can be compared with an earlier one, which flags every stage
+that got slower than the threshold:
+
+    python benchmarks/bench_pipeline.py --scales 10k 1m 10m --output report.json
+    python benchmarks/bench_pipeline.py --scales 10k 1m --compare report.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # not on Windows, peak memory is then read from /proc only
+    resource = None
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+STAGES = ["fetch", "parse", "categorize", "aggregate", "figure", "serialize"]
+SAMPLE_INTERVAL = 0.005  # seconds between memory samples
+THRESHOLD = 1.25  # a stage this many times slower than in the compared report is a regression
+
+
+def parse_scale(label):
+    """
+    :param label: a number of rows, like 250000, 250k or 1m
+    :return: the number of rows
+    """
+    label = label.lower()
+    if label in SCALES:
+        return SCALES[label]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(label[-1], 1)
+    return int(float(label.rstrip("km")) * multiplier)
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """
+    Samples the resident memory of the process on a background thread
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_bytes = self.peak_bytes = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, _rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, _rss_bytes())
+
+
+@contextmanager
+def stage(results, name):
+    """
+    Times a stage and records its peak memory in results[name]. The stage can
+    leave time out of its timing by adding it to the yielded dict's "excluded".
+    """
+    clock = {"excluded": 0.0}
+    with MemorySampler() as memory:
+        start = time.perf_counter()
+        yield clock
+        seconds = time.perf_counter() - start - clock["excluded"]
+    results[name] = {
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(memory.peak_bytes / 2 ** 20, 1),
+        "added_mb": round((memory.peak_bytes - memory.start_bytes) / 2 ** 20, 1),
+    }
+
+
+def _serve(counts, latency, queue):
+    # runs in its own process, until it is terminated
+    from mock_ckan import MockCkan, SyntheticRecords
+    resources = {resource_id: SyntheticRecords(year, count) for resource_id, (year, count) in counts.items()}
+    with MockCkan(resources, latency=latency) as mock:
+        queue.put(mock.base_url)
+        threading.Event().wait()
+
+
+def _page_offsets(counts, page_size):
+    return [(resource_id, offset) for resource_id, (_, count) in counts.items()
+            for offset in range(0, count, page_size)]
+
+
+def _get_page(session, base_url, resource_id, offset, page_size):
+    from ckan_client import TIMEOUT
+    response = session.get(
+        f"{base_url}/datastore_search",
+        params={"resource_id": resource_id, "limit": page_size, "offset": offset, "sort": "_id asc"},
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def run_scale(rows, page_size, latency, max_workers):
+    """
+    Runs every stage on `rows` synthetic records
+    :param rows: number of records, split evenly between the years
+    :param page_size: number of records per request
+    :param latency: seconds every request of the mock waits before answering
+    :param max_workers: number of concurrent requests
+    :return: dict of the rows and the seconds and memory of every stage
+    """
+    from charts import (ALL_CRIMES, ALL_DISTRICTS, ALL_MAP_YEARS, ALL_YEARS, figure_bytes, map_figure,
+                        oct7_counts, oct7_figure, overview_figure)
+    from ckan_client import RESOURCES, make_session, read_page_frame
+    from cube import build_cube
+    from geometry import ZIP_PATH, load_boundaries, load_geojson_bytes
+    from heatmap_data import build_heatmap_frame
+    from merhav_names import build_merhav_index, merhav_codes
+    from preprocessing import add_categories, build_analytics_frame
+    from schema import concat_frames
+
+    counts = {resource_id: (int(year), rows // len(RESOURCES) + (i < rows % len(RESOURCES)))
+              for i, (year, resource_id) in enumerate(RESOURCES.items())}
+    gdf = load_boundaries(zip_path=os.path.join(ROOT, ZIP_PATH))
+    geojson = json.loads(load_geojson_bytes(zip_path=os.path.join(ROOT, ZIP_PATH)))
+    session = make_session(max_workers)
+    pages = _page_offsets(counts, page_size)
+    results = {}
+
+    queue = multiprocessing.get_context("spawn").Queue()
+    server = multiprocessing.get_context("spawn").Process(target=_serve, args=(counts, latency, queue), daemon=True)
+    server.start()
+    try:
+        base_url = queue.get(timeout=60)
+
+        with stage(results, "fetch"):
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                fetched = sum(pool.map(lambda key: len(_get_page(session, base_url, *key, page_size)), pages))
+
+        frames = {resource_id: [] for resource_id in counts}
+        with stage(results, "parse") as clock:
+            for resource_id, offset in pages:
+                start = time.perf_counter()
+                body = _get_page(session, base_url, resource_id, offset, page_size)
+                clock["excluded"] += time.perf_counter() - start  # the download was timed by fetch
+                frames[resource_id].append(read_page_frame(io.BytesIO(body), offset)[0])
+                del body
+            years = [concat_frames(year_frames) for year_frames in frames.values()]
+            del frames
+    finally:
+        server.terminate()
+
+    with stage(results, "categorize"):
+        frame = build_analytics_frame(pd.concat([add_categories(df) for df in years], ignore_index=True))
+        del years
+
+    with stage(results, "aggregate"):
+        cube = build_cube(frame)
+        grouped = oct7_counts(cube)
+        heatmap_cube = build_cube(build_heatmap_frame(frame), dimensions=["Year", "StatisticGroup", "PoliceMerhav"],
+                                  derived=[])
+        heatmap_cube["MerhavCode"] = merhav_codes(heatmap_cube["PoliceMerhav"],
+                                                  build_merhav_index(gdf["MerhavName"]))[0]
+
+    with stage(results, "figure"):
+        overview = overview_figure(cube, ALL_YEARS, True)
+        oct7 = oct7_figure(grouped, ALL_DISTRICTS)
+        merhav_map = map_figure(heatmap_cube, gdf["unique_id"], gdf["MerhavName"], geojson, ALL_CRIMES, ALL_MAP_YEARS)
+
+    with stage(results, "serialize"):
+        sizes = {"overview_png": len(figure_bytes(overview)), "oct7_json": len(oct7.to_json()),
+                 "map_json": len(merhav_map.to_json())}
+
+    return {
+        "rows": int(len(frame)),
+        "requested_rows": rows,
+        "pages": len(pages),
+        "fetched_mb": round(fetched / 2 ** 20, 1),
+        "cube_cells": int(len(cube)),
+        "frame_mb": round(frame.memory_usage(deep=True).sum() / 2 ** 20, 1),
+        "artifact_bytes": sizes,
+        "total_seconds": round(sum(result["seconds"] for result in results.values()), 4),
+        "peak_rss_mb": max(result["peak_rss_mb"] for result in results.values()),
+        "stages": {name: results[name] for name in STAGES},
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """
+    :return: dict describing the machine and the library versions, for comparing reports
+    """
+    try:
+        import ijson
+        parser = f"ijson {ijson.backend}"
+    except ImportError:
+        parser = "json"
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "parser": parser,
+    }
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    """
+    Prints the ratio of every stage's time to the baseline's
+    :param report: the new report
+    :param baseline: an earlier report
+    :param threshold: ratio above which a stage counts as a regression
+    :return: list of (scale, stage, ratio) of the regressions
+    """
+    regressions = []
+    for label, result in report["scales"].items():
+        base = baseline["scales"].get(label)
+        if base is None:
+            continue
+        for name, current in result["stages"].items():
+            before = base["stages"].get(name)
+            if not before or not before["seconds"]:
+                continue
+            ratio = current["seconds"] / before["seconds"]
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"{label:>6} {name:<11} {before['seconds']:9.3f}s -> {current['seconds']:9.3f}s "
+                  f"({ratio:.2f}x){flag}")
+            if ratio > threshold:
+                regressions.append((label, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", nargs="+", default=list(SCALES), help="numbers of rows, like 10k 1m 10m")
+    parser.add_argument("--page-size", type=int, default=32000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent requests")
+    parser.add_argument("--output", default="bench_pipeline.json", help="path of the JSON report")
+    parser.add_argument("--compare", help="path of an earlier report to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    report = {
+        "environment": environment(),
+        "config": {"page_size": args.page_size, "latency": args.latency, "workers": args.workers},
+        "scales": {},
+    }
+    for label in args.scales:
+        rows = parse_scale(label)
+        # a fresh process per scale
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(run_scale, rows, args.page_size, args.latency, args.workers).result()
+        report["scales"][label] = result
+        print(f"{label}: {result['rows']} rows, {result['total_seconds']:.2f}s, peak {result['peak_rss_mb']} MB")
+        for name, stage_result in result["stages"].items():
+            print(f"  {name:<11} {stage_result['seconds']:9.3f}s  +{stage_result['added_mb']} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
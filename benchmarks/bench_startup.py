@@ -0,0 +1,114 @@
+"""
+Measures what a new app worker pays before it draws anything.
+
+Every target is imported in a fresh interpreter under `python -X importtime`,
+which reports the total import time and the heaviest packages. The "shell" is
+what main.py imports for the sidebar, every page adds its own module, and
+"all pages" imports everything at once, the way main.py did before the pages
+were split out. With --app, a fresh process runs the app with Streamlit's
+AppTest on synthetic snapshots, and times its first paint, of the overview page,
+and the first switch from it to every other page.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --app --rows 20000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# target -> the modules it imports
+TARGETS = {
+    "shell": ["streamlit", "app_data", "data_service", "instrumentation"],
+    "overview": ["streamlit", "app_data", "data_service", "instrumentation", "page_overview"],
+    "oct7": ["streamlit", "app_data", "data_service", "instrumentation", "page_oct7"],
+    "map": ["streamlit", "app_data", "data_service", "instrumentation", "page_map"],
+    "all pages": ["streamlit", "app_data", "data_service", "instrumentation", "page_overview", "page_oct7",
+                  "page_map", "matplotlib.pyplot", "seaborn", "plotly.express", "geopandas"],
+}
+PAGES = {"map": 1, "oct7": 2}  # page -> index of its menu option, switched to from the first page
+
+
+def import_times(modules):
+    """
+    Imports modules in a fresh interpreter under -X importtime
+    :param modules: names of the modules
+    :return: (total seconds, dict of top-level package -> seconds spent importing its modules)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or not fields[0].strip().isdigit():
+            continue  # the header
+        package = fields[2].strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(fields[0]) / 1e6
+    return sum(packages.values()), packages
+
+
+_FIRST_RUN = """
+import os, sys, time
+sys.path[:0] = [{root!r}, os.path.join({root!r}, "benchmarks")]
+os.chdir({root!r})
+import pandas as pd
+from mock_ckan import make_records
+import snapshot_store
+from ckan_client import RESOURCES
+for year, resource_id in RESOURCES.items():
+    if snapshot_store.read_manifest(resource_id) is None:
+        snapshot_store.write_snapshot(resource_id, pd.DataFrame(make_records(year, {rows})), "bench")
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(os.path.join({root!r}, "main.py"), default_timeout=300)
+start = time.perf_counter()
+app.run()
+print(time.perf_counter() - start)
+start = time.perf_counter()
+app.sidebar.radio[0].set_value(app.sidebar.radio[0].options[{index}]).run()
+print(time.perf_counter() - start)
+"""
+
+
+def first_run(index, rows, cache_dir):
+    """
+    Times the first run of the app in a fresh process, which draws the first
+    page, and the run that then switches to another page
+    :param index: index of the menu option of the page switched to
+    :param rows: synthetic records per year of the snapshots
+    :param cache_dir: directory of the snapshot store, shared by the runs
+    :return: (seconds until the first page was drawn, seconds of the switch)
+    """
+    env = dict(os.environ, CRIME_CACHE_DIR=cache_dir, CRIME_SHARED_DIR=tempfile.mkdtemp(),
+               CRIME_ARTIFACT_DIR=tempfile.mkdtemp(), CRIME_HEATMAP_DIR=tempfile.mkdtemp())
+    result = subprocess.run([sys.executable, "-c", _FIRST_RUN.format(root=ROOT, rows=rows, index=index)],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    first, switch = result.stdout.split()[-2:]
+    return float(first), float(switch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=6, help="heaviest packages shown per target")
+    parser.add_argument("--app", action="store_true", help="also time the first paint and the first switch to every page")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic records per year, with --app")
+    args = parser.parse_args()
+
+    for target, modules in TARGETS.items():
+        total, packages = import_times(modules)
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        print(f"{target:<10} {total:6.3f}s  " + ", ".join(f"{name} {seconds:.3f}" for name, seconds in heaviest))
+
+    if args.app:
+        cache_dir = tempfile.mkdtemp()
+        for page, index in PAGES.items():
+            first, switch = first_run(index, args.rows, cache_dir)
+            print(f"first paint {first:6.3f}s, then to {page} {switch:6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+A local mock of the data.gov.il CKAN datastore API, used by the benchmarks.
+Serves synthetic crime records shaped like the real resources, with an
+optional per-request latency to imitate the round trip to data.gov.il.
+"""
+import json
+import random
+import threading
+import time
+from collections.abc import Sequence
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATISTIC_GROUPS = [
+    'עבירות כלפי הרכוש', 'עבירות נגד גוף', 'עבירות נגד אדם', 'עבירות מין',
+    'עבירות כלפי המוסר', 'עבירות סדר ציבורי', 'עבירות בטחון', 'עבירות כלכליות',
+    'עבירות מנהליות', 'עבירות רשוי', 'עבירות תנועה', 'עבירות מרמה',
+]
+DISTRICTS = {
+    'מחוז תא': ['מרחב איילון החדש תא', 'מרחב ירקון תא', 'מרחב דן תא'],
+    'מחוז מרכז': ['מרחב שרון', 'מרחב שפלה', 'מרחב נתבג מרכז'],
+    'מחוז חוף': ['מרחב כרמל חוף', 'מרחב אשר חוף', 'מרחב מנשה חוף'],
+    'מחוז צפון': ['מרחב גליל צפון', 'מרחב כנרת צפון', 'מרחב עמקים צפון'],
+    'מחוז דרומי': ['מרחב לכיש', 'מרחב נגב', 'מרחב אילת דרום'],
+    'מחוז ירושלים': ['מרחב דוד ירושלים', 'מרחב קדם ירושלים', 'מרחב ציון ירושלים'],
+    'מחוז שי': ['מרחב יהודה שי', 'מרחב שומרון שי'],
+}
+
+
+def make_records(year, count, seed=0, first_id=1):
+    """
+    Generates synthetic records of one year
+    :param year: the year of the records
+    :param count: number of records
+    :param seed: random seed, so runs are comparable
+    :param first_id: the _id of the first record
+    :return: list of record dicts
+    """
+    rng = random.Random(f"{seed}-{year}")
+    districts = list(DISTRICTS)
+    records = []
+    for i in range(count):
+        district = rng.choice(districts)
+        records.append({
+            "_id": first_id + i,
+            "FictiveIDNumber": f"{rng.getrandbits(128):032X}",
+            "Year": int(year),
+            "Quarter": f"Q{rng.randint(1, 4)}",
+            "PoliceDistrict": district,
+            "PoliceMerhav": rng.choice(DISTRICTS[district]),
+            "StatisticGroup": rng.choice(STATISTIC_GROUPS),
+        })
+    return records
+
+
+class SyntheticRecords(Sequence):
+    """
+    The records of one year, generated block by block as they are served, so
+    the mock can serve millions of them without holding them all. A record is
+    the same whichever page it is served in.
+    """
+    BLOCK = 10000
+
+    def __init__(self, year, count, seed=0, first_id=1):
+        """
+        :param year: the year of the records
+        :param count: number of records
+        :param seed: random seed, so runs are comparable
+        :param first_id: the _id of the first record
+        """
+        self.year = year
+        self.count = count
+        self.seed = seed
+        self.first_id = first_id
+        self._block = lru_cache(maxsize=8)(self._make_block)
+
+    def _make_block(self, block):
+        start = block * self.BLOCK
+        return make_records(self.year, min(self.BLOCK, self.count - start),
+                            seed=f"{self.seed}-{block}", first_id=self.first_id + start)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self._block(index // self.BLOCK)[index % self.BLOCK]
+
+
+class MockCkan:
+    """
+    Runs the mock server on a background thread.
+    Use as a context manager; `base_url` points at the mock action API.
+    """
+
+    def __init__(self, resources, latency=0.0, port=0):
+        """
+        :param resources: dict of resource id -> list of records, or SyntheticRecords
+        :param latency: seconds every request waits before answering
+        :param port: port to listen on, a free one by default
+        """
+        self.resources = resources
+        self.latency = latency
+        self.last_modified = {resource_id: "2024-01-01T00:00:00" for resource_id in resources}
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/api/3/action"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock.requests += 1
+                time.sleep(mock.latency)
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                action = url.path.rsplit("/", 1)[-1]
+                if action == "datastore_search":
+                    self._reply(mock.datastore_search(params))
+                elif action == "resource_show":
+                    self._reply(mock.resource_show(params))
+                else:
+                    self._reply({"success": False}, status=404)
+
+            def _reply(self, body, status=200):
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def datastore_search(self, params):
+        records = self.resources[params["resource_id"]]
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 100))
+        return {
+            "success": True,
+            "result": {
+                "resource_id": params["resource_id"],
+                "records": records[offset:offset + limit],
+                "total": len(records),
+            },
+        }
+
+    def resource_show(self, params):
+        return {
+            "success": True,
+            "result": {"id": params["id"], "last_modified": self.last_modified[params["id"]]},
+        }
@@ -0,0 +1,342 @@
+"""
+The dashboard's charts, built from the count cubes and a page's filters.
+
+A chart depends only on the cubes and the filters, so it can be rendered ahead
+of time or cached per data version and filter state. Matplotlib figures are
+closed once they are rendered, so they never pile up in pyplot's global state.
+
+Matplotlib, seaborn and plotly express are imported by the charts that draw
+with them, so a page only pays for the libraries of its own charts.
+"""
+import io
+
+import pandas as pd
+
+from choropleth import merhav_map_figure
+from cube import query
+from event_window import event_window_counts, normalize_by_quarters
+from merhav_names import merhav_totals
+from preprocessing import AFTER_OCT7, BEFORE_OCT7, OCT7_DATE, preprocess_data_district
+
+ALL_YEARS = "כל השנים"
+
+# the overview's x labels, reversed for matplotlib's left to right drawing
+OVERVIEW_TICKTEXT = [text[::-1] for text in [
+    "\u202Bכלליות\nעבירות פליליות",
+    "\u202Bוסדר ציבורי\nעבירות מוסר",
+    "\u202Bביטחון\nעבירות",
+    "\u202Bכלכליות ומנהליות\nעבירות",
+    "\u202Bמרמה\nעבירות",
+    "\u202Bתנועה\nעבירות"
+]]
+OVERVIEW_Y_MAX = 18000  # y axis of a single year
+OVERVIEW_QUARTER_Y_MAX = 6000  # y axis of a single year split by quarters
+
+
+def figure_bytes(fig, image_format="png", dpi=200, close=True):
+    """
+    Renders a figure the way st.pyplot does, and closes it
+    :param fig: matplotlib figure
+    :param image_format: png or svg
+    :param dpi: resolution of png images
+    :param close: whether to close the figure, False to render it again in another format
+    :return: the image's bytes
+    """
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=image_format, dpi=dpi, bbox_inches="tight")
+    finally:
+        if close:
+            plt.close(fig)
+    return buffer.getvalue()
+
+
+def overview_figure(cube, year_selected, split_by_quarter):
+    """
+    Bar chart of the number of offenses of every category
+    :param cube: the count cube
+    :param year_selected: a year, or ALL_YEARS
+    :param split_by_quarter: whether to split every bar by quarters
+    :return: matplotlib figure, to be closed by the caller
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    unique_categories = cube["ReversedStatisticGroup"].drop_duplicates().tolist()
+    year_filter = {} if year_selected == ALL_YEARS else {"Year": int(year_selected)}
+    crime_counts = query(cube, ["ReversedStatisticGroup"], **year_filter).reindex(unique_categories, fill_value=0)
+
+    # Sort categories by total count
+    unique_categories = crime_counts.sort_values(ascending=False).index.tolist()
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    if split_by_quarter:
+        grouped_data = query(cube, ["ReversedStatisticGroup", "Quarter"], **year_filter).reset_index(name="Counts")
+        grouped_data["Quarter"] = "Q" + grouped_data["Quarter"].astype(str)
+
+        sns.barplot(
+            data=grouped_data,
+            x="ReversedStatisticGroup",
+            y="Counts",
+            hue="Quarter",
+            palette=["#FF5733", "#FFC300", "#28B463", "#1E90FF"],
+            order=unique_categories,
+            ax=ax,
+            zorder=2
+        )
+        ax.legend(title="ןועבר", fontsize=10, title_fontsize=12)
+        if year_selected == ALL_YEARS:
+            max_y = grouped_data["Counts"].max()
+            ax.set_ylim(0, max_y + (0.1 * max_y))
+        else:
+            ax.set_ylim(0, OVERVIEW_QUARTER_Y_MAX)
+
+        ax.set_xlabel("עשפה גוס", fontsize=14)
+        ax.set_ylabel("תוריבעה תומכ", fontsize=14)
+        ax.set_xticks(range(len(OVERVIEW_TICKTEXT)))
+        ax.set_xticklabels(OVERVIEW_TICKTEXT, rotation=0, ha='center', fontsize=12)
+        ax.grid(axis='y', color='lightgrey', linewidth=0.5, zorder=0)
+
+    else:
+        crime_counts = crime_counts.reindex(unique_categories, fill_value=0)
+        crime_counts.index = OVERVIEW_TICKTEXT
+
+        if year_selected == ALL_YEARS:
+            max_y = crime_counts.max()
+            ax.set_ylim(0, max_y + (0.1 * max_y))
+        else:
+            ax.set_ylim(0, OVERVIEW_Y_MAX)
+
+        crime_counts.plot(kind="bar", ax=ax, color='orange', zorder=2)
+
+        ax.set_xticks(range(len(OVERVIEW_TICKTEXT)))
+        ax.set_xticklabels(OVERVIEW_TICKTEXT, rotation=0, ha='center', fontsize=12)
+        ax.set_xlabel("עשפה גוס", fontsize=14)
+        ax.set_ylabel("תוריבעה תומכ", fontsize=14)
+        ax.grid(axis='y', color='lightgrey', linewidth=0.5)
+
+    fig.tight_layout()
+    return fig
+
+
+def trend_figure(series, categories):
+    """
+    Line chart of the number of offenses of every category per quarter, with
+    its anomalous quarters marked and a line at the Oct-7 quarter
+    :param series: the QuarterlySeries of the counts
+    :param categories: the categories drawn
+    :return: plotly figure
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    agg_df = series.frame(categories)
+    unique_quarters = series.labels()
+
+    fig = px.line(
+        agg_df,
+        x='Quarter',
+        y='Count',
+        color='Category',
+        title="מגמות פשיעה לאורך השנים",
+        labels={
+            'Quarter': 'רבעון',
+            'Count': 'מספר עבירות',
+            'Category': 'סוג עבירה'
+        },
+        color_discrete_sequence=px.colors.qualitative.Bold
+    )
+
+    anomalies = agg_df[agg_df['Anomaly']]
+    if len(anomalies):
+        fig.add_trace(go.Scatter(
+            x=anomalies['Quarter'],
+            y=anomalies['Count'],
+            mode="markers",
+            marker=dict(symbol="circle-open", size=14, color="red", line=dict(width=2)),
+            name="חריגה",
+            customdata=anomalies[['Category', 'ZScore', 'YoY']],
+            hovertemplate="%{customdata[0]}<br>%{x}: %{y}<br>z=%{customdata[1]:.1f}, "
+                          "שינוי שנתי %{customdata[2]:+,.0f}<extra></extra>",
+        ))
+
+    # Add the vertical line only if the event's quarter is in the data
+    event_quarter = series.event_label(OCT7_DATE)
+    if event_quarter is not None:
+        fig.add_vline(
+            x=event_quarter,
+            line_dash="dash",
+            line_color="gray",
+        )
+
+        # Add annotation
+        fig.add_annotation(
+            x=event_quarter,
+            y=1.02,  # Position slightly above the plot area (2% above the top of the plot)
+            text="השבעה באוקטובר",
+            showarrow=False,
+            font=dict(size=14, color="gray"),
+            align="center",
+            xanchor="center",
+            yanchor="bottom",
+            yref="paper"  # Use the paper coordinate system for the Y-axis
+        )
+
+    return fig.update_layout(
+        xaxis_title="רבעון",
+        yaxis_title="מספר עבירות",
+        yaxis=dict(tick0=0, dtick=500),
+        plot_bgcolor="#f9f9f9",
+        xaxis=dict(categoryorder="array", categoryarray=unique_quarters),
+        legend=dict(
+            title="",  # Remove legend title
+            itemclick=False,  # Disable clicking to hide traces
+            itemdoubleclick=False  # Disable double-click to isolate traces
+        ),
+        title=dict(
+            text="פשיעה לאורך השנים לפי סוגי עבירות",
+            x=0.5,  # Align title to the right
+            xanchor="center",
+            font=dict(size=24)  # Increase font size
+        )
+    )
+
+
+ALL_DISTRICTS = "כל המחוזות"
+
+OCT7_TICKTEXT = [
+    "עבירות פליליות<br>כלליות",
+    "עבירות מוסר<br>וסדר ציבורי",
+    "עבירות<br>ביטחון",
+    "עבירות<br>כלכליות ומנהליות",
+    "עבירות<br>מרמה",
+    "עבירות<br>תנועה"
+]
+
+
+def oct7_counts(cube):
+    """
+    :param cube: the count cube
+    :return: pandas df of the counts per quarter of every category, period and district
+    """
+    counts, quarters = event_window_counts(cube, OCT7_DATE, ["Category", "PoliceDistrict"],
+                                           labels=(BEFORE_OCT7, AFTER_OCT7))
+
+    # Apply preprocessing
+    grouped = preprocess_data_district(counts)
+
+    # Normalize by the number of quarters in the data before and after the event
+    grouped = normalize_by_quarters(grouped, quarters)
+    return grouped
+
+
+def oct7_districts(grouped):
+    """
+    :param grouped: pandas df from oct7_counts
+    :return: the districts to choose from, all the districts first
+    """
+    return sorted(grouped["PoliceDistrict"].unique(), key=lambda x: (x != ALL_DISTRICTS, x))
+
+
+def oct7_figure(grouped, selected_district):
+    """
+    Bar chart of the counts per quarter before and after Oct-7
+    :param grouped: pandas df from oct7_counts
+    :param selected_district: a district, or ALL_DISTRICTS
+    :return: plotly figure
+    """
+    import plotly.express as px
+
+    # Filter data based on selected district
+    if selected_district == ALL_DISTRICTS:
+        filtered_df = grouped
+    else:
+        filtered_df = grouped[grouped["PoliceDistrict"] == selected_district]
+
+    # Aggregate data
+    aggregated_df = filtered_df.groupby(["Category", "Period"], as_index=False, observed=True)["NormalizedCount"].sum()
+
+    # Pivot the aggregated data
+    pivot_df = (
+        aggregated_df.pivot(index="Category", columns="Period", values="NormalizedCount")
+        .fillna(0)  # Fill missing values with 0
+        .reset_index()
+    )
+
+    # Generate bar chart
+    pivot_df = pivot_df.sort_values(by=[BEFORE_OCT7, AFTER_OCT7], ascending=False)
+
+    return px.bar(
+        pivot_df,
+        x="Category",
+        y=[BEFORE_OCT7, AFTER_OCT7],
+        barmode="group",
+        labels={"value": "כמות עבירות מנורמלת לרבעון", "variable": "", "Category": "קטגוריה"},  # הורדת המילה "תקופה"
+        title=f"פשיעה ב{selected_district}"  # Update title to "פשיעה ב"
+    ).update_layout(
+        xaxis_title="סוגי עבירות",
+        yaxis_title="כמות עבירות מנורמלת לרבעון",
+        legend_title="",  # הסרת כותרת האגדה
+        plot_bgcolor="#f9f9f9",
+        title=dict(
+            text=f"פשיעה ב{selected_district}",  # Update title to "פשיעה ב"
+            x=1,  # Align title to the right
+            xanchor="right",  # Anchor title to the right
+            font=dict(size=28)  # Adjust title font size
+        ),
+        xaxis=dict(
+            tickmode="array",
+            tickvals=pivot_df["Category"].tolist(),
+            ticktext=OCT7_TICKTEXT,
+            tickfont=dict(size=18),  # גודל הטקסט של הקטגוריות בציר X
+            title_font=dict(size=20)  # גודל הטקסט של כותרת ציר X
+        ),
+        yaxis=dict(
+            tickfont=dict(size=18),  # גודל הטקסט של המספרים בציר Y
+            title_font=dict(size=20),  # גודל הטקסט של כותרת ציר Y
+            gridcolor="lightgrey",  # צבע קווים חלש יותר
+            gridwidth=0.5  # עובי קווים דק יותר
+        ),
+        legend=dict(
+            font=dict(size=18)  # גודל הטקסט של האגדה (legend)
+        ),
+        height=700  # Increase height for better visualization
+    )
+
+
+ALL_CRIMES = "כל סוגי העבירות"
+ALL_MAP_YEARS = "לאורך כל השנים"
+MAP_ZOOM = 6.2
+
+
+def map_figure(heatmap_cube, ids, names, geojson, selected_crime, selected_year):
+    """
+    Choropleth of the number of offenses in every Merhav
+    :param heatmap_cube: the heatmap cube, with the MerhavCode of every cell
+    :param ids: unique_id of every polygon
+    :param names: MerhavName of every polygon
+    :param geojson: the boundaries' GeoJSON dict, or its URL
+    :param selected_crime: a statistic group, or ALL_CRIMES
+    :param selected_year: a year, or ALL_MAP_YEARS
+    :return: plotly figure
+    """
+    # Summarize counts by Merhav for the selections
+    selected = pd.Series(True, index=heatmap_cube.index)
+    if selected_crime != ALL_CRIMES:
+        selected &= heatmap_cube['StatisticGroup'] == selected_crime
+    if selected_year != ALL_MAP_YEARS:
+        selected &= heatmap_cube['Year'] == int(selected_year)
+    cells = heatmap_cube[selected]
+    record_count = merhav_totals(cells['MerhavCode'].to_numpy(), cells['Count'].to_numpy(), len(ids))
+
+    return merhav_map_figure(
+        geojson=geojson,
+        ids=ids,
+        names=names,
+        values=record_count,
+        title=f"{selected_year} מפת עבירות" if selected_year != ALL_MAP_YEARS else "2020-2024 מפת עבירות",
+        zoom=MAP_ZOOM,
+    )
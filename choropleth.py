@@ -0,0 +1,65 @@
+"""
+The Merhav choropleth, split into the parts that never change and the value
+vector that changes with every filter.
+
+The boundaries are passed to plotly by URL when Streamlit serves them as a
+static file, so a rerun only sends the Merhav ids, names and counts. Without
+static serving the parsed GeoJSON dict is passed instead, and is still built
+only once per process.
+"""
+import plotly.graph_objects as go
+
+MAP_CENTER = {"lat": 31.5, "lon": 34.8}  # Centered on Israel
+
+
+def merhav_map_figure(geojson, ids, names, values, title, zoom):
+    """
+    :param geojson: URL of the boundaries GeoJSON, or the GeoJSON dict
+    :param ids: unique_id of every Merhav, the GeoJSON feature ids
+    :param names: name of every Merhav
+    :param values: number of records of every Merhav
+    :param title: the map's title
+    :param zoom: the map's zoom level
+    :return: plotly figure of the map
+    """
+    fig = go.Figure(go.Choroplethmapbox(
+        geojson=geojson,
+        locations=ids,
+        z=values,
+        text=names,
+        hovertemplate="<b>%{text}</b><br>מספר עבירות=%{z}<extra></extra>",
+        colorscale="Reds",
+        reversescale=True,  # Set to True if you want to reverse light-to-dark order
+        colorbar=dict(title="מספר עבירות"),
+        marker_line_width=0.5,
+    ))
+
+    # Update layout for vertical orientation
+    fig.update_layout(
+        annotations=[
+            dict(
+                text=title,
+                x=1,  # Align to the far right
+                y=1.1,  # Place above the map
+                xref="paper",  # Use the figure as the reference frame
+                yref="paper",
+                showarrow=False,  # No arrow for the annotation
+                font=dict(size=24, color="black"),
+                align="right"  # Align the text to the right
+            )
+        ],
+        mapbox=dict(
+            center=MAP_CENTER,
+            zoom=zoom,  # Zoom out slightly to show entire Israel
+            style="carto-positron"
+        ),
+        height=800,  # Taller map for vertical orientation
+        width=500,
+        margin=dict(
+            l=20,  # Left margin
+            r=20,  # Right margin for better alignment
+            t=80,  # Top margin for annotation space
+            b=20  # Bottom margin
+        )
+    )
+    return fig
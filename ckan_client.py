@@ -0,0 +1,279 @@
+"""
+Client for the data.gov.il CKAN datastore API.
+
+Every yearly resource is paged through with large pages, and all years and pages
+are fetched at the same time over one pooled keep-alive session.
+
+The ingest path (fetch_frames, fetch_new_frame) never holds a whole response:
+each page is parsed as it streams in, straight into one buffer per schema
+column, and turned into a compact frame before the next page is read, so the
+memory a download takes grows with the page size rather than the dataset.
+Without ijson a page is parsed in one go and dropped right after.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from schema import RECORD_SCHEMA, apply_schema, concat_frames
+
+try:
+    import ijson
+except ImportError:  # pages are then parsed whole, one at a time
+    ijson = None
+
+BASE_URL = "https://data.gov.il/api/3/action"
+
+# resource id of the crime records of every year
+RESOURCES = {
+    "2020": "520597e3-6003-4247-9634-0ae85434b971",
+    "2021": "3f71fd16-25b8-4cfe-8661-e6199db3eb12",
+    "2022": "a59f3e9e-a7fe-4375-97d0-76cea68382c1",
+    "2023": "32aacfc9-3524-4fba-a282-3af052380244",
+    "2024": "5fc13c50-b6f3-4712-b831-a75e0f91a17e",
+}
+
+PAGE_SIZE = 32000
+MAX_WORKERS = 16
+TIMEOUT = (5, 60)  # (connect, read) seconds
+RETRIES = 3
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def make_session(pool_size=MAX_WORKERS, retries=RETRIES):
+    """
+    Creates a keep-alive session that retries failed requests with backoff
+    :param pool_size: number of connections kept open to the server
+    :param retries: how many times a failed request is retried
+    :return: requests session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """
+    :return: the session shared by every fetch in this process
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = make_session()
+        return _session
+
+
+def fetch_page(session, resource_id, offset=0, limit=PAGE_SIZE, base_url=BASE_URL):
+    """
+    Fetches one page of a datastore resource
+    :param session: requests session to use
+    :param resource_id: the CKAN resource id
+    :param offset: index of the first record of the page
+    :param limit: page size
+    :param base_url: the CKAN action API url
+    :return: (list of records, total number of records in the resource)
+    """
+    response = session.get(
+        f"{base_url}/datastore_search",
+        params={"resource_id": resource_id, "limit": limit, "offset": offset, "sort": "_id asc"},
+        timeout=TIMEOUT,
+    )
+    response.raise_for_status()
+    result = response.json()["result"]
+    records = result["records"]
+    return records, result.get("total", offset + len(records))
+
+
+RECORDS_PREFIX = "result.records.item"  # ijson prefix of a record in a datastore_search response
+
+
+def _stream_columns(raw, columns):
+    # only the events of the schema's fields are kept, a record is never built
+    buffers = {column: [] for column in columns}
+    fields = {f"{RECORDS_PREFIX}.{column}": buffers[column] for column in columns}
+    rows, total = 0, None
+    for prefix, event, value in ijson.parse(raw, use_float=True):
+        buffer = fields.get(prefix)
+        if buffer is not None:
+            buffer.append(value)
+        elif prefix == RECORDS_PREFIX and event == "end_map":
+            rows += 1
+            for buffer in buffers.values():
+                if len(buffer) < rows:  # the record has no such field
+                    buffer.append(None)
+        elif prefix == "result.total":
+            total = int(value)
+    return buffers, rows, total
+
+
+def _parse_columns(raw, columns):
+    result = json.load(raw)["result"]
+    records = result.pop("records")
+    buffers = {column: [record.get(column) for record in records] for column in columns}
+    return buffers, len(records), result.get("total")
+
+
+def read_page_frame(raw, offset=0, schema=RECORD_SCHEMA):
+    """
+    Parses a datastore_search response into a frame of the schema's columns
+    :param raw: binary file-like object of the response body
+    :param offset: index of the first record of the page
+    :param schema: dict of column -> dtype of the columns to keep
+    :return: (pandas df of the page, total number of records in the resource)
+    """
+    parse = _stream_columns if ijson is not None else _parse_columns
+    buffers, rows, total = parse(raw, schema)
+    frame = apply_schema(pd.DataFrame(buffers), schema)
+    return frame, total if total is not None else offset + rows
+
+
+def fetch_page_frame(session, resource_id, offset=0, limit=PAGE_SIZE, base_url=BASE_URL, schema=RECORD_SCHEMA):
+    """
+    Fetches one page of a datastore resource into a frame of the schema's
+    columns, parsing the response as it arrives
+    :param session: requests session to use
+    :param resource_id: the CKAN resource id
+    :param offset: index of the first record of the page
+    :param limit: page size
+    :param base_url: the CKAN action API url
+    :param schema: dict of column -> dtype of the columns to keep
+    :return: (pandas df of the page, total number of records in the resource)
+    """
+    with session.get(
+        f"{base_url}/datastore_search",
+        params={"resource_id": resource_id, "limit": limit, "offset": offset, "sort": "_id asc"},
+        timeout=TIMEOUT,
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True  # undo the transfer compression
+        return read_page_frame(response.raw, offset, schema)
+
+
+def fetch_last_modified(session, resource_id, base_url=BASE_URL):
+    """
+    Fetches the time the resource's data was last changed
+    :param session: requests session to use
+    :param resource_id: the CKAN resource id
+    :param base_url: the CKAN action API url
+    :return: the last-modified timestamp string, or None if the API has none
+    """
+    response = session.get(f"{base_url}/resource_show", params={"id": resource_id}, timeout=TIMEOUT)
+    response.raise_for_status()
+    result = response.json()["result"]
+    return result.get("last_modified") or result.get("metadata_modified")
+
+
+def _fetch_pages(resources, fetch, page_size, max_workers):
+    """
+    Fetches every page of every resource. The first page of each resource is
+    requested at once, and the rest of its pages as soon as its total is known.
+    :param resources: dict of year -> resource id
+    :param fetch: function of (resource id, offset) returning (page, total number of records)
+    :param page_size: number of records per request
+    :param max_workers: number of concurrent requests
+    :return: dict of year -> list of its pages, in resource order
+    """
+    pages = {year: {} for year in resources}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        first_pages = {pool.submit(fetch, resource_id, 0): year for year, resource_id in resources.items()}
+        rest_pages = {}
+        for future in as_completed(first_pages):
+            year = first_pages[future]
+            page, total = future.result()
+            pages[year][0] = page
+            for offset in range(page_size, total, page_size):
+                rest_pages[pool.submit(fetch, resources[year], offset)] = (year, offset)
+
+        for future in as_completed(rest_pages):
+            year, offset = rest_pages[future]
+            pages[year][offset] = future.result()[0]
+
+    return {year: [year_pages[offset] for offset in sorted(year_pages)] for year, year_pages in pages.items()}
+
+
+def fetch_records(resources=RESOURCES, base_url=BASE_URL, page_size=PAGE_SIZE,
+                  max_workers=MAX_WORKERS, session=None):
+    """
+    Fetches every record of every resource as dicts, concurrently
+    :param resources: dict of year -> resource id
+    :param base_url: the CKAN action API url
+    :param page_size: number of records per request
+    :param max_workers: number of concurrent requests
+    :param session: requests session, the shared one by default
+    :return: dict of year -> list of records, in resource order
+    """
+    session = session or get_session()
+    pages = _fetch_pages(
+        resources, lambda resource_id, offset: fetch_page(session, resource_id, offset, page_size, base_url),
+        page_size, max_workers,
+    )
+    return {year: [record for page in year_pages for record in page] for year, year_pages in pages.items()}
+
+
+def fetch_frames(resources=RESOURCES, base_url=BASE_URL, page_size=PAGE_SIZE,
+                 max_workers=MAX_WORKERS, session=None, schema=RECORD_SCHEMA):
+    """
+    Fetches every record of every resource into a frame per year, concurrently,
+    holding only the schema's columns of every page
+    :param resources: dict of year -> resource id
+    :param base_url: the CKAN action API url
+    :param page_size: number of records per request
+    :param max_workers: number of concurrent requests
+    :param session: requests session, the shared one by default
+    :param schema: dict of column -> dtype of the columns to keep
+    :return: dict of year -> pandas df of the year's records, in resource order
+    """
+    session = session or get_session()
+    pages = _fetch_pages(
+        resources,
+        lambda resource_id, offset: fetch_page_frame(session, resource_id, offset, page_size, base_url, schema),
+        page_size, max_workers,
+    )
+    return {year: concat_frames(year_pages, schema) for year, year_pages in pages.items()}
+
+
+def fetch_new_frame(session, resource_id, last_id, offset, page_size=PAGE_SIZE, base_url=BASE_URL,
+                    schema=RECORD_SCHEMA):
+    """
+    Fetches only the records appended to a resource since it was last read,
+    into a frame of the schema's columns. datastore_search can't filter on a
+    range of _id, so records are paged in _id order from the last one already
+    held, which must still be there: if it moved, records held were deleted or
+    rewritten upstream, and paging by offset would skip new ones.
+    :param session: requests session to use
+    :param resource_id: the CKAN resource id
+    :param last_id: the highest _id already held
+    :param offset: number of records already held
+    :param page_size: number of records per request
+    :param base_url: the CKAN action API url
+    :param schema: dict of column -> dtype of the columns to keep
+    :return: (pandas df of the new records, or None if the records held changed
+    upstream, total number of records in the resource)
+    """
+    offset = max(offset - 1, 0)  # the last record held, as an anchor
+    frame, total = fetch_page_frame(session, resource_id, offset, page_size, base_url, schema)
+    if last_id and (not len(frame) or frame["_id"].iloc[0] != last_id):
+        return None, total
+    frames = [frame[frame["_id"] > last_id]]
+    offset += page_size
+    while offset < total:
+        frame = fetch_page_frame(session, resource_id, offset, page_size, base_url, schema)[0]
+        frames.append(frame[frame["_id"] > last_id])
+        offset += page_size
+    return concat_frames(frames, schema), total
@@ -1,16 +1,21 @@
 import streamlit as st
 import pandas as pd
-import requests
 import matplotlib.pyplot as plt
 from matplotlib import rcParams
 
+from app_data import load_version, start_loader, wait_for_data
+from ckan_client import RESOURCES
+from data_service import load_shared
+from preprocessing import reverse_labels
+from snapshot_store import read_snapshot
+
 # Set Matplotlib font to display Hebrew
 rcParams['font.family'] = 'Arial'
 rcParams['axes.unicode_minus'] = False  # Ensure minus signs display correctly
 
 # Add custom CSS styling for RTL support
 st.markdown(
-    \"\"\"
+    """
     <style>
     body {
         direction: rtl;
@@ -25,43 +30,43 @@ st.markdown(
         text-align: right;
     }
     </style>
-    \"\"\",
+    """,
     unsafe_allow_html=True,
 )
 
 # Function to load and process data
-def load_data():
-    urls = {
-        "2020": "https://data.gov.il/api/3/action/datastore_search?resource_id=520597e3-6003-4247-9634-0ae85434b971",
-        "2021": "https://data.gov.il/api/3/action/datastore_search?resource_id=3f71fd16-25b8-4cfe-8661-e6199db3eb12",
-        "2022": "https://data.gov.il/api/3/action/datastore_search?resource_id=a59f3e9e-a7fe-4375-97d0-76cea68382c1",
-        "2023": "https://data.gov.il/api/3/action/datastore_search?resource_id=32aacfc9-3524-4fba-a282-3af052380244",
-        "2024": "https://data.gov.il/api/3/action/datastore_search?resource_id=5fc13c50-b6f3-4712-b831-a75e0f91a17e",
-    }
+def build_data(years):
     data_frames = []
-    for year, url in urls.items():
-        response = requests.get(url)
-        data = response.json()
-        records = data['result']['records']
-        df = pd.DataFrame(records)
-        df['Year'] = year  # Add a year column
-        # reverse statisticType column for Hebrew
-        df["ReversedStatisticGroup"] = df["StatisticGroup"].apply(lambda x: x[::-1])
+    for year in years:
+        df = read_snapshot(RESOURCES[year])
+        df['Year'] = int(year)  # Add a year column
         data_frames.append(df)
-    return pd.concat(data_frames, ignore_index=True)
+    df_all = pd.concat(data_frames, ignore_index=True)
+    # Ensure proper handling of Hebrew text
+    df_all["StatisticGroup"] = df_all["StatisticGroup"].astype(str).astype("category")
+    # reverse statisticType column for Hebrew
+    df_all["ReversedStatisticGroup"] = reverse_labels(df_all["StatisticGroup"])
+    return df_all
+
+
+def load_data():
+    """
+    The snapshots are downloaded and refreshed in the background, as in main.py,
+    so a rerun never waits on the API
+    :return: (the records of the years loaded so far, shared by every session and
+    process, read-only, the years)
+    """
+    version, years = load_version()
+    return load_shared("crime_dashboard", version, lambda: build_data(years)), years
 
 # Load the data
 st.title("פשע בישראל (2020-2024)")
 st.sidebar.header("אפשרויות סינון")
-df_all = load_data()
-
-# Convert "Year" to int and ensure proper handling of Hebrew text
-df_all["Year"] = pd.to_numeric(df_all["Year"], errors="coerce")
-df_all["StatisticGroup"] = df_all["StatisticGroup"].astype(str)
+df_all, loaded_years = load_data()
 
 # Sidebar filter options
 years = st.sidebar.multiselect("בחר שנים", sorted(df_all["Year"].unique()), default=sorted(df_all["Year"].unique()))
-crime_types = st.sidebar.multiselect("בחר סוגי פשעים", df_all["StatisticGroup"].unique(), default=df_all["StatisticGroup"].unique())
+crime_types = st.sidebar.multiselect("בחר סוגי פשעים", df_all["StatisticGroup"].unique().tolist(), default=df_all["StatisticGroup"].unique().tolist())
 
 # Filter the data based on user selection
 filtered_data = df_all[(df_all["Year"].isin(years)) & (df_all["StatisticGroup"].isin(crime_types))]
@@ -72,7 +77,7 @@ if filtered_data.empty:
     st.write("אין נתונים זמינים עבור הבחירה.")
 else:
     # Group and plot the data
-    crime_counts = filtered_data.groupby(["Year", "ReversedStatisticGroup"]).size().unstack(fill_value=0)
+    crime_counts = filtered_data.groupby(["Year", "ReversedStatisticGroup"], observed=True).size().unstack(fill_value=0)
     fig, ax = plt.subplots(figsize=(12, 6))
     crime_counts.plot(kind="bar", ax=ax, width=0.8)
 
@@ -91,7 +96,7 @@ else:
 
 
 ### overview visualization
-df = load_data()
+df = df_all
 st.title("Crime Analysis Dashboard")
 st.title("Crime Analysis Dashboard")
 st.sidebar.header("Filter Options")
@@ -107,7 +112,7 @@ else:
     filtered_data = df[df["Year"] == int(selected_year)]
 
 # Group by crime type and count
-crime_counts = filtered_data.groupby("ReversedStatisticGroup").size()
+crime_counts = filtered_data.groupby("ReversedStatisticGroup", observed=True).size()
 
 # Visualization
 st.subheader("Crime Counts by Type")
@@ -119,3 +124,8 @@ ax.set_title("מספר הפשעים לפי סוג", fontsize=16)
 ax.set_xlabel("מספר הפשעים", fontsize=14)
 ax.set_ylabel("סוג הפשע", fontsize=14)
 ax.tick_params(axis="y", labelrotation=0)  # Keep Hebrew labels readable
+
+# Fill the page in with the years still loading
+loader = start_loader()
+if not loader.done():
+    wait_for_data(loader, len(loaded_years))
@@ -0,0 +1,49 @@
+"""
+A materialized count cube over the dimensions the dashboard filters and groups by.
+
+The cube is built once per data version, and every chart is a query on it, so
+interactions cost as much as the cube's few thousand cells rather than the
+number of crime records.
+"""
+import pandas as pd
+
+DIMENSIONS = ["Year", "Quarter", "Category", "StatisticGroup", "PoliceDistrict", "PoliceMerhav"]
+
+# columns that are determined by the dimensions, kept in the cube so pages can
+# group by them without adding cells
+DERIVED = ["Period", "ReversedStatisticGroup"]
+
+
+def build_cube(df, dimensions=DIMENSIONS, derived=DERIVED):
+    """
+    Counts the records of every combination of the dimensions
+    :param df: pandas df of crime records
+    :param dimensions: the columns to count by
+    :param derived: columns determined by the dimensions, carried along
+    :return: pandas df with a row per non-empty cell and its Count
+    """
+    keys = dimensions + [column for column in derived if column in df.columns]
+    cube = df.groupby(keys, observed=True, dropna=False).size().reset_index(name="Count")
+    for column in keys:
+        if cube[column].dtype == object or pd.api.types.is_string_dtype(cube[column]):
+            cube[column] = cube[column].astype("category")
+    return cube
+
+
+def query(cube, by=(), dropna=True, **filters):
+    """
+    Slices the cube by the filters and rolls it up to the given dimensions
+    :param cube: a cube from build_cube
+    :param by: the dimensions to keep, all others are summed over
+    :param dropna: whether to drop cells with a missing value in `by`
+    :param filters: dimension=value or dimension=list of values to keep
+    :return: pandas series of counts indexed by `by`, or the total if `by` is empty
+    """
+    for dimension, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            cube = cube[cube[dimension].isin(value)]
+        else:
+            cube = cube[cube[dimension] == value]
+    if not by:
+        return cube["Count"].sum()
+    return cube.groupby(list(by), observed=True, dropna=dropna)["Count"].sum()
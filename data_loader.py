@@ -0,0 +1,119 @@
+"""
+Background download of the snapshots, shared by every session of the server.
+
+On a cold start the missing years are downloaded on a background thread, each
+year as its own task, so the app can render as soon as the first year lands
+instead of blocking on all of them. There is one loader per server process, so
+sessions that start during the download wait on the same fetch.
+
+Years that failed to download, e.g. when the server started offline, are
+downloaded again by retry, at most once every RETRY_BACKOFF seconds.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ckan_client import BASE_URL, RESOURCES
+from snapshot_store import CACHE_DIR, DEFAULT_TTL, ensure_snapshots, read_manifest
+
+RETRY_BACKOFF = 60  # seconds after a download ended before its failed years are retried
+
+
+class SnapshotLoader:
+    """
+    Makes sure every year has a snapshot, on a background thread, and tells
+    which years are ready so far
+    """
+
+    def __init__(self, resources=RESOURCES, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR, base_url=BASE_URL):
+        self.resources = resources
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.errors = {}  # year -> the exception that failed it
+        self._ready = set()
+        self._finished = False
+        self._finished_at = None  # time.monotonic() of the end of the last download
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def start(self):
+        """
+        Starts the download, once
+        :return: the loader
+        """
+        with self._condition:
+            if self._thread is None:
+                self._start_thread(list(self.resources))
+        return self
+
+    def retry(self, backoff=RETRY_BACKOFF):
+        """
+        Downloads the failed years again, once the download ended at least
+        `backoff` seconds ago
+        :param backoff: seconds to wait after the end of the last download
+        :return: True if a retry was started
+        """
+        with self._condition:
+            if not self._finished or not self.errors or time.monotonic() - self._finished_at < backoff:
+                return False
+            years = list(self.errors)
+            self.errors = {}
+            self._finished = False
+            self._start_thread(years)
+            return True
+
+    def _start_thread(self, years):
+        # called with the condition held
+        self._thread = threading.Thread(target=self._run, args=(years,), name="snapshot-loader", daemon=True)
+        self._thread.start()
+
+    def _run(self, years):
+        with ThreadPoolExecutor(max_workers=len(years)) as pool:
+            futures = {
+                pool.submit(ensure_snapshots, {year: self.resources[year]}, self.ttl, self.cache_dir,
+                            self.base_url): year
+                for year in years
+            }
+            for future in as_completed(futures):
+                year = futures[future]
+                try:
+                    future.result()
+                    error = None
+                except Exception as e:  # reported to the app, the other years still load
+                    error = e
+                with self._condition:
+                    if error is not None:
+                        # replaced rather than updated, so the app can read the dict without the lock
+                        self.errors = {**self.errors, year: error}
+                    if read_manifest(self.resources[year], self.cache_dir) is not None:
+                        self._ready.add(year)
+                    self._condition.notify_all()
+        with self._condition:
+            self._finished = True
+            self._finished_at = time.monotonic()
+            self._condition.notify_all()
+
+    def ready(self):
+        """
+        :return: dict of year -> resource id of the years whose snapshot is ready
+        """
+        with self._condition:
+            return {year: resource_id for year, resource_id in self.resources.items() if year in self._ready}
+
+    def done(self):
+        """
+        :return: True once every year was either loaded or failed
+        """
+        with self._condition:
+            return self._finished
+
+    def wait(self, ready_count, timeout=None):
+        """
+        Waits until more than `ready_count` years are ready, or the download ended
+        :param ready_count: number of years ready when the caller last looked
+        :param timeout: seconds to wait at most
+        :return: True unless the timeout passed
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: len(self._ready) > ready_count or self._finished, timeout)
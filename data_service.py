@@ -0,0 +1,132 @@
+"""
+Process-wide store of the frames the dashboards read, shared by every session.
+Frames loaded with load_shared are also shared by the processes of the node,
+see shared_store.
+
+A frame is loaded once per data version. Concurrent requests for a frame that
+is still loading wait on the one load in flight instead of starting their own,
+and every caller gets the same object, without copies, so it must be treated
+as read-only. The service counts hits, misses and coalesced requests,
+annotates the running instrumentation span with the outcome, and reports the
+memory the frames take.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from instrumentation import annotate
+from shared_store import shared_frame
+
+MAX_VERSIONS = 2  # versions kept per frame, so sessions on the previous one aren't reloaded
+
+
+def _memory_bytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class DataService:
+    """
+    Loads every (name, version) frame once and hands it out to all the callers
+    """
+
+    def __init__(self, max_versions=MAX_VERSIONS):
+        self.max_versions = max_versions
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # requests that waited on a load in flight
+        self._entries = {}  # name -> OrderedDict of version -> frame, oldest first
+        self._in_flight = {}  # (name, version) -> Future of the load
+        self._lock = threading.Lock()
+
+    def get(self, name, version, load):
+        """
+        :param name: name of the frame
+        :param version: the data version it is loaded from
+        :param load: function loading the frame, called only on a miss
+        :return: the shared frame, read-only
+        """
+        key = (name, version)
+        loading = False
+        with self._lock:
+            versions = self._entries.get(name, {})
+            if version in versions:
+                self.hits += 1
+                versions.move_to_end(version)
+                annotate(cache="hit")
+                return versions[version]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                future = self._in_flight[key] = Future()
+                loading = True
+        annotate(cache="miss" if loading else "coalesced")
+        if not loading:
+            return future.result()
+
+        try:
+            value = load()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            versions = self._entries.setdefault(name, OrderedDict())
+            versions[version] = value
+            while len(versions) > self.max_versions:
+                versions.popitem(last=False)
+            del self._in_flight[key]
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        """
+        :return: dict of the hit/miss counters and the memory of every frame in MB
+        """
+        with self._lock:
+            entries = {f"{name}@{version}": value for name, versions in self._entries.items()
+                       for version, value in versions.items()}
+            counters = {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                        "in_flight": len(self._in_flight)}
+        memory = {key: round(_memory_bytes(value) / 2 ** 20, 1) for key, value in entries.items()}
+        return {**counters, "memory_mb": memory, "total_memory_mb": round(sum(memory.values()), 1)}
+
+    def clear(self):
+        """
+        Drops every loaded frame, loads in flight still finish
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """
+    :return: the process's data service
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = DataService()
+        return _service
+
+
+def load_shared(name, version, build):
+    """
+    Gets a frame through the process's data service, attaching to the copy
+    published for the whole node, so only one process on it builds the frame
+    :param name: name of the frame
+    :param version: the data version it is built from
+    :param build: function building the frame
+    :return: the shared frame, read-only
+    """
+    return get_service().get(name, version, lambda: shared_frame(name, version, build))
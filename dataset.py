@@ -0,0 +1,52 @@
+"""
+The steps from the snapshot store to the frames and cubes the pages read.
+
+These are plain functions without Streamlit, shared by the app, which caches
+them per data version, and by the offline jobs.
+"""
+import pandas as pd
+
+from ckan_client import RESOURCES
+from cube import build_cube
+from heatmap_data import load_heatmap_dataset
+from merhav_names import build_merhav_index, merhav_codes, report_unmatched
+from preprocessing import add_categories, build_analytics_frame
+from snapshot_store import CACHE_DIR, read_snapshot
+
+
+def load_categorized_year(year, resources=RESOURCES, cache_dir=CACHE_DIR):
+    """
+    Loads and categorizes the records of one year
+    :param year: the year to load
+    :param resources: dict of year -> resource id
+    :param cache_dir: root of the snapshot store
+    :return: pandas df of the year's categorized records
+    """
+    df = read_snapshot(resources[year], cache_dir)
+    df['Year'] = int(year)  # Add year column
+    return add_categories(df)
+
+
+def load_analytics_frame(resources=RESOURCES, cache_dir=CACHE_DIR):
+    """
+    :param resources: dict of year -> resource id
+    :param cache_dir: root of the snapshot store
+    :return: the analytics-ready pandas df of all the years
+    """
+    data_frames = [load_categorized_year(year, resources, cache_dir) for year in resources]
+    return build_analytics_frame(pd.concat(data_frames, ignore_index=True))
+
+
+def build_heatmap_cube(version, load_records, boundary_names):
+    """
+    :param version: the snapshot store's data version
+    :param load_records: function returning the crime records of that version
+    :param boundary_names: the MerhavName of every polygon, in polygon order
+    :return: count cube of the heatmap records by year, statistic group and Merhav,
+    with the MerhavCode of the boundary polygon every cell is joined to
+    """
+    heatmap = load_heatmap_dataset(version, load_records)
+    cube = build_cube(heatmap, dimensions=["Year", "StatisticGroup", "PoliceMerhav"], derived=[])
+    cube['MerhavCode'], unmatched = merhav_codes(cube['PoliceMerhav'], build_merhav_index(boundary_names))
+    report_unmatched(unmatched)
+    return cube
@@ -0,0 +1,63 @@
+"""
+Before/after comparison of many events at once.
+
+The quarterly counts are aggregated from the cube once, and every event is a
+cut-over on the same array of quarter keys, so N events cost one pass over the
+quarterly cells rather than N passes over the records.
+
+    # build_cube from cube.py, load_analytics_frame from dataset.py
+    event_study(build_cube(load_analytics_frame()), {"COVID lockdown": "2020-03-25", "7.10": "2023-10-07"})
+"""
+import numpy as np
+import pandas as pd
+
+from cube import query
+from event_window import AFTER, BEFORE, quarter_key, quarter_keys
+from preprocessing import preprocess_data_district
+
+
+def event_study(cube, events, by=("Category", "PoliceDistrict"), labels=(BEFORE, AFTER)):
+    """
+    Counts and counts per quarter before and after every event, for every
+    combination of the `by` dimensions. With PoliceDistrict in `by` the districts
+    are preprocessed as on the Oct-7 page, all the districts included.
+    :param cube: a cube with Year and Quarter dimensions
+    :param events: dict of event name -> cut-over date
+    :param by: the dimensions to compare the events by
+    :param labels: names of the periods before and after an event
+    :return: tidy pandas df of Event, the `by` dimensions, Period, Count, Quarters and NormalizedCount
+    """
+    by = list(by)
+    quarterly = query(cube, by + ["Year", "Quarter"]).reset_index(name="Count")
+    if "PoliceDistrict" in by:
+        quarterly = preprocess_data_district(
+            quarterly, keys=[column for column in by if column != "PoliceDistrict"] + ["Year", "Quarter"]
+        )
+
+    grouper = quarterly.groupby(by, observed=True, sort=True)
+    group_codes = grouper.ngroup().to_numpy()
+    groups = grouper.size().index.to_frame(index=False)
+    keys = quarter_keys(quarterly["Year"], quarterly["Quarter"])
+    cutovers = np.array([quarter_key(date) for date in events.values()])
+    group_count, event_count = len(groups), len(cutovers)
+
+    # one bin per group, event and period
+    after = keys[:, None] >= cutovers[None, :]
+    bins = (group_codes[:, None] * event_count + np.arange(event_count)[None, :]) * 2 + after
+    weights = np.broadcast_to(quarterly["Count"].to_numpy()[:, None], bins.shape)
+    counts = np.bincount(bins.ravel(), weights=weights.ravel(), minlength=group_count * event_count * 2)
+
+    distinct = np.unique(keys)
+    quarters_after = np.count_nonzero(distinct[:, None] >= cutovers[None, :], axis=0)
+    quarters = np.stack([len(distinct) - quarters_after, quarters_after], axis=1)
+
+    group_index = np.repeat(np.arange(group_count), event_count * 2)
+    event_index = np.tile(np.repeat(np.arange(event_count), 2), group_count)
+    period_index = np.tile([0, 1], group_count * event_count)
+    study = groups.iloc[group_index].reset_index(drop=True)
+    study.insert(0, "Event", pd.Categorical.from_codes(event_index, categories=list(events)))
+    study["Period"] = pd.Categorical.from_codes(period_index, categories=list(labels))
+    study["Count"] = counts.astype("int64")
+    study["Quarters"] = quarters[event_index, period_index]
+    study["NormalizedCount"] = np.round(study["Count"] / np.maximum(study["Quarters"], 1)).astype("int64")
+    return study
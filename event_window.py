@@ -0,0 +1,80 @@
+"""
+Before/after comparison of the counts around an event, on any cut-over date.
+
+Quarters are handled as integer keys (year * 4 + quarter - 1), so splitting the
+records at a cut-over and normalizing by the number of quarters on each side is
+array arithmetic. The number of quarters is taken from the data itself.
+"""
+import numpy as np
+import pandas as pd
+
+from cube import query
+
+BEFORE = "before"
+AFTER = "after"
+
+
+def quarter_key(date):
+    """
+    :param date: a date, or anything pd.Timestamp accepts
+    :return: integer key of the quarter the date falls in
+    """
+    date = pd.Timestamp(date)
+    return date.year * 4 + date.quarter - 1
+
+
+def quarter_keys(years, quarters):
+    """
+    :param years: array of years
+    :param quarters: array of quarters, 1 to 4
+    :return: int32 array of quarter keys
+    """
+    return np.asarray(years, dtype="int32") * 4 + np.asarray(quarters, dtype="int32") - 1
+
+
+def window_periods(keys, cutover, labels=(BEFORE, AFTER)):
+    """
+    :param keys: array of quarter keys
+    :param cutover: the event's date, its quarter is the first one after it
+    :param labels: names of the periods before and after the event
+    :return: categorical of the period of every key
+    """
+    after = np.asarray(keys) >= quarter_key(cutover)
+    return pd.Categorical.from_codes(after.astype("int8"), categories=list(labels))
+
+
+def period_quarters(keys, cutover):
+    """
+    :param keys: array of quarter keys in the data
+    :param cutover: the event's date
+    :return: int array of the number of distinct quarters before and after the event
+    """
+    distinct = np.unique(keys)
+    after = int(np.count_nonzero(distinct >= quarter_key(cutover)))
+    return np.array([len(distinct) - after, after])
+
+
+def event_window_counts(cube, cutover, by=(), labels=(BEFORE, AFTER)):
+    """
+    Counts of the cube before and after an event
+    :param cube: a cube with Year and Quarter dimensions
+    :param cutover: the event's date
+    :param by: dimensions to keep besides the period
+    :param labels: names of the periods before and after the event
+    :return: (pandas df of `by`, Period and Count, array of the number of quarters of every period)
+    """
+    keys = quarter_keys(cube["Year"], cube["Quarter"])
+    periods = cube[list(by) + ["Count"]].assign(Period=window_periods(keys, cutover, labels))
+    counts = query(periods, list(by) + ["Period"]).reset_index(name="Count")
+    return counts, period_quarters(keys, cutover)
+
+
+def normalize_by_quarters(counts, quarters):
+    """
+    Adds the NormalizedCount column, the count per quarter of the row's period
+    :param counts: pandas df with a categorical Period and a Count column
+    :param quarters: array of the number of quarters of every period
+    :return: pandas df with the normalized counts
+    """
+    divisors = np.maximum(quarters, 1)[counts["Period"].cat.codes.to_numpy()]
+    return counts.assign(NormalizedCount=np.round(counts["Count"].to_numpy() / divisors).astype("int64"))
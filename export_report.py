@@ -0,0 +1,192 @@
+"""
+Headless export of every view of the dashboard, for the weekly reports.
+
+Every chart variant the pages can show is rendered with the same data and chart
+code as the app, without a browser: every variant the prerender step renders,
+and the trend of all the categories and of every single one. The variants are
+rendered in a process pool, whose workers write their files directly:
+
+    overview   PNG and SVG, and an HTML page with the SVG inline (matplotlib)
+    trend, oct7, map
+               HTML, sharing one copy of plotly.js, and PNG and SVG when
+               kaleido is installed
+
+The map's HTML embeds the boundaries, so every file opens on its own. Next to
+the charts, summary.csv holds the counts of the cube by year, quarter, district
+and category, and manifest.csv lists every file with its filters.
+
+    python export_report.py                       # into reports/<data version>
+    python export_report.py --out weekly --formats png html --workers 8
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from charts import MAP_ZOOM, figure_bytes
+from cube import query
+from geometry import load_geojson_bytes, tier_for_zoom
+from prerender import build_inputs, chart_variants, init_worker, variant_figure
+from snapshot_store import data_version, ensure_snapshots
+
+try:
+    import kaleido
+except ImportError:  # Plotly charts are then exported as HTML only
+    kaleido = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.environ.get("CRIME_EXPORT_DIR", "reports")
+FORMATS = ("png", "svg", "html")
+SUMMARY_DIMENSIONS = ["Year", "Quarter", "PoliceDistrict", "Category"]
+PLOTLY_JS = "plotly.min.js"
+
+_HTML_PAGE = """<!DOCTYPE html>
+<html lang="he" dir="rtl">
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>{body}</body>
+</html>
+"""
+
+
+def report_variants(cube, heatmap_cube):
+    """
+    :param cube: the count cube
+    :param heatmap_cube: the heatmap cube
+    :return: list of (kind, key) of every chart variant, the trend's key being the categories drawn
+    """
+    categories = sorted(cube["Category"].dropna().unique())
+    variants = chart_variants(cube, heatmap_cube)
+    variants += [("trend", tuple(categories))] + [("trend", (category,)) for category in categories]
+    return variants
+
+
+def variant_stem(kind, key):
+    """
+    :param kind: the chart
+    :param key: the filter values of the variant
+    :return: file name of the variant, without an extension
+    """
+    if kind == "trend" and len(key) > 1:
+        key = ("all",)
+    elif kind == "overview":
+        key = (key[0], "quarters" if key[1] else "total")
+    return re.sub(r"[^\w-]+", "_", "-".join(str(value) for value in (kind,) + tuple(key))).strip("_")
+
+
+def _svg_page(title, svg):
+    svg = svg.decode("utf-8")
+    return _HTML_PAGE.format(title=title, body=svg[svg.index("<svg"):])
+
+
+def export_variant(variant, out_dir, formats):
+    """
+    Renders a variant in a worker process and writes its files
+    :param variant: (kind, key) from report_variants
+    :param out_dir: directory of the files
+    :param formats: the formats to write, of FORMATS
+    :return: list of manifest rows of the written files
+    """
+    kind, key = variant
+    stem = variant_stem(kind, key)
+    start = time.perf_counter()
+    fig = variant_figure(kind, key)
+    files = {}
+    if kind == "overview":
+        images = [image_format for image_format in ("png", "svg") if image_format in formats]
+        if "html" in formats and "svg" not in images:
+            images.append("svg")
+        for i, image_format in enumerate(images):
+            files[image_format] = figure_bytes(fig, image_format, close=i == len(images) - 1)
+        if "html" in formats:
+            files["html"] = _svg_page(stem, files["svg"]).encode("utf-8")
+            if "svg" not in formats:
+                del files["svg"]
+    else:
+        if "html" in formats:
+            files["html"] = fig.to_html(include_plotlyjs=PLOTLY_JS).encode("utf-8")
+        if kaleido is not None:
+            files.update((image_format, fig.to_image(format=image_format))
+                         for image_format in ("png", "svg") if image_format in formats)
+    seconds = round(time.perf_counter() - start, 3)
+
+    rows = []
+    for image_format, data in files.items():
+        name = f"{stem}.{image_format}"
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+        rows.append({"file": name, "chart": kind, "filters": " | ".join(str(value) for value in key),
+                     "format": image_format, "bytes": len(data), "seconds": seconds})
+    return rows
+
+
+def write_csv(path, rows, fields):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:  # with a BOM, so Excel reads the Hebrew
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def export_report(out_dir=None, formats=FORMATS, max_workers=None):
+    """
+    Exports every chart variant of the snapshot store's current data version,
+    with its summary and manifest CSVs
+    :param out_dir: directory of the report, reports/<data version> by default
+    :param formats: the formats to write, of FORMATS
+    :param max_workers: number of worker processes, one per core by default
+    :return: (directory of the report, list of manifest rows)
+    """
+    ensure_snapshots()
+    version = data_version()
+    out_dir = out_dir or os.path.join(EXPORT_DIR, version)
+    os.makedirs(out_dir, exist_ok=True)
+    if kaleido is None and set(formats) & {"png", "svg"}:
+        logger.warning("kaleido is not installed, the Plotly charts are exported as HTML only")
+
+    cube, heatmap_cube, gdf = build_inputs(version)
+    # the map's HTML embeds the boundaries instead of the app's static URL
+    geojson = json.loads(load_geojson_bytes(tier_for_zoom(MAP_ZOOM)))
+    if "html" in formats:
+        # written once here, instead of by every worker
+        from plotly.offline import get_plotlyjs
+        with open(os.path.join(out_dir, PLOTLY_JS), "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+
+    variants = report_variants(cube, heatmap_cube)
+    manifest = []
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker,
+                             initargs=(cube, heatmap_cube, list(gdf['unique_id']), list(gdf['MerhavName']),
+                                       geojson)) as pool:
+        for rows in pool.map(export_variant, variants, [out_dir] * len(variants), [formats] * len(variants),
+                             chunksize=4):
+            manifest += rows
+
+    summary = query(cube, SUMMARY_DIMENSIONS).reset_index(name="Count")
+    write_csv(os.path.join(out_dir, "summary.csv"), summary.to_dict("records"), SUMMARY_DIMENSIONS + ["Count"])
+    write_csv(os.path.join(out_dir, "manifest.csv"), manifest,
+              ["file", "chart", "filters", "format", "bytes", "seconds"])
+    logger.info("exported %d files of data version %s to %s", len(manifest), version, out_dir)
+    return out_dir, manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every chart variant of the current data version")
+    parser.add_argument("--out", default=None, help="directory of the report, reports/<data version> by default")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    start = time.perf_counter()
+    out_dir, manifest = export_report(args.out, args.formats, args.workers)
+    print(f"{len(manifest)} files written to {out_dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
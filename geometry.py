@@ -0,0 +1,207 @@
+"""
+Preparation of the police Merhav boundaries for the map page.
+
+Unzipping the FileGDB, parsing it and reprojecting it to WGS84 is done once per
+checksum of the zip. The layer is written in several simplification tiers, each
+as GeoParquet and as compact GeoJSON, which later runs read directly.
+
+Tiers are simplified as a coverage, so neighbouring Merhavim keep sharing their
+borders, and their coordinates are rounded to a grid that fits the tier. Shared
+vertices round to the same point, so no gaps open between neighbours.
+
+geopandas and shapely are imported only where the layer is read or written,
+so the map page can start from the prepared files without them.
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import zipfile
+
+import numpy as np
+
+ZIP_PATH = "policestationboundaries.gdb.zip"
+GDB_NAME = "PoliceStationBoundaries.gdb"
+LAYER_NAME = "PoliceMerhavBoundaries"
+GEOMETRY_DIR = os.environ.get("CRIME_GEOMETRY_DIR", os.path.join(".cache", "geometry"))
+
+# tier -> (simplification tolerance in meters, decimal places kept in WGS84)
+TIERS = {
+    "full": (0, 6),
+    "high": (25, 5),
+    "medium": (100, 5),
+    "low": (400, 4),
+}
+
+
+def zip_checksum(zip_path=ZIP_PATH):
+    """
+    :param zip_path: path of the zipped FileGDB
+    :return: sha256 of the zip, shortened
+    """
+    digest = hashlib.sha256()
+    with open(zip_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def read_gdb_layer(zip_path=ZIP_PATH, layer_name=LAYER_NAME):
+    """
+    Reads a layer straight from the zipped FileGDB, in its own projected CRS and
+    with clean Merhav names
+    :param zip_path: path of the zipped FileGDB
+    :param layer_name: the layer to read
+    :return: GeoDataFrame of the layer
+    """
+    import geopandas as gpd
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(tmp_dir)
+        gdf = gpd.read_file(os.path.join(tmp_dir, GDB_NAME), layer=layer_name)
+
+    gdf['MerhavName'] = gdf['MerhavName'].str.strip().str.replace(r'\r\n', '', regex=True)
+    centroids = gdf.geometry.centroid.to_crs(epsg=4326)
+    gdf['centroid_lat'] = centroids.y
+    gdf['centroid_lon'] = centroids.x
+    gdf['unique_id'] = gdf.index
+    return gdf
+
+
+def simplify_tier(gdf, tier):
+    """
+    Simplifies a projected layer to a tier and reprojects it to WGS84
+    :param gdf: GeoDataFrame in a CRS measured in meters
+    :param tier: name of the tier in TIERS
+    :return: GeoDataFrame of the tier in WGS84
+    """
+    import geopandas as gpd
+    import shapely
+
+    tolerance, decimals = TIERS[tier]
+    geoms = gdf.geometry.values
+    if tolerance:
+        if hasattr(shapely, "coverage_simplify"):
+            geoms = shapely.coverage_simplify(geoms, tolerance)
+        else:  # shapely < 2.1, neighbours may not line up exactly
+            geoms = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    tier_gdf = gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs)).to_crs(epsg=4326)
+
+    coordinates = np.round(shapely.get_coordinates(tier_gdf.geometry.values), decimals)
+    tier_gdf.geometry = shapely.set_coordinates(tier_gdf.geometry.values.copy(), coordinates)
+    return tier_gdf
+
+
+def to_geojson_bytes(gdf):
+    """
+    :param gdf: GeoDataFrame of a tier
+    :return: compact GeoJSON of the polygons, with unique_id as the feature id
+    """
+    import shapely.geometry
+
+    features = [
+        {
+            "type": "Feature",
+            "id": int(unique_id),
+            "properties": {"MerhavName": name},
+            "geometry": shapely.geometry.mapping(geometry),
+        }
+        for unique_id, name, geometry in zip(gdf['unique_id'], gdf['MerhavName'], gdf.geometry)
+    ]
+    collection = {"type": "FeatureCollection", "features": features}
+    return json.dumps(collection, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _tier_path(cache_dir, layer_name, checksum, tier, extension):
+    return os.path.join(cache_dir, f"{layer_name}-{checksum}-{tier}.{extension}")
+
+
+def prepare_boundaries(zip_path=ZIP_PATH, layer_name=LAYER_NAME, cache_dir=GEOMETRY_DIR):
+    """
+    Writes every tier of the layer as GeoParquet and GeoJSON, unless they were
+    already prepared from the same zip
+    :param zip_path: path of the zipped FileGDB
+    :param layer_name: the layer to prepare
+    :param cache_dir: directory of the prepared files
+    :return: the zip's checksum, which names the prepared files
+    """
+    checksum = zip_checksum(zip_path)
+    if all(os.path.exists(_tier_path(cache_dir, layer_name, checksum, tier, "geojson")) for tier in TIERS):
+        return checksum
+
+    os.makedirs(cache_dir, exist_ok=True)
+    gdf = read_gdb_layer(zip_path, layer_name)
+    for tier in TIERS:
+        tier_gdf = simplify_tier(gdf, tier)
+        parquet_path = _tier_path(cache_dir, layer_name, checksum, tier, "parquet")
+        tier_gdf.to_parquet(f"{parquet_path}.tmp")
+        os.replace(f"{parquet_path}.tmp", parquet_path)
+        geojson_path = _tier_path(cache_dir, layer_name, checksum, tier, "geojson")
+        with open(f"{geojson_path}.tmp", "wb") as f:
+            f.write(to_geojson_bytes(tier_gdf))
+        os.replace(f"{geojson_path}.tmp", geojson_path)
+    return checksum
+
+
+def tier_for_zoom(zoom, latitude=31.5):
+    """
+    Picks the coarsest tier whose simplification stays under a pixel at a zoom level
+    :param zoom: the map's zoom level
+    :param latitude: latitude the map is centered on
+    :return: name of the tier
+    """
+    meters_per_pixel = 78271.517 * math.cos(math.radians(latitude)) / 2 ** zoom
+    fitting = [tier for tier, (tolerance, _) in TIERS.items() if tolerance <= meters_per_pixel]
+    return max(fitting, key=lambda tier: TIERS[tier][0])
+
+
+def load_boundaries(tier="full", zip_path=ZIP_PATH, layer_name=LAYER_NAME, cache_dir=GEOMETRY_DIR):
+    """
+    :param tier: name of the tier in TIERS
+    :param zip_path: path of the zipped FileGDB
+    :param layer_name: the layer to load
+    :param cache_dir: directory of the prepared files
+    :return: GeoDataFrame of the prepared layer
+    """
+    import geopandas as gpd
+
+    checksum = prepare_boundaries(zip_path, layer_name, cache_dir)
+    return gpd.read_parquet(_tier_path(cache_dir, layer_name, checksum, tier, "parquet"))
+
+
+def load_geojson_bytes(tier="full", zip_path=ZIP_PATH, layer_name=LAYER_NAME, cache_dir=GEOMETRY_DIR):
+    """
+    :param tier: name of the tier in TIERS
+    :param zip_path: path of the zipped FileGDB
+    :param layer_name: the layer to load
+    :param cache_dir: directory of the prepared files
+    :return: the tier's GeoJSON as bytes
+    """
+    checksum = prepare_boundaries(zip_path, layer_name, cache_dir)
+    with open(_tier_path(cache_dir, layer_name, checksum, tier, "geojson"), "rb") as f:
+        return f.read()
+
+
+def publish_geojson(tier="full", static_dir="static", zip_path=ZIP_PATH, layer_name=LAYER_NAME,
+                    cache_dir=GEOMETRY_DIR):
+    """
+    Copies a tier's GeoJSON into Streamlit's static folder, so the browser can
+    fetch it once by URL and cache it instead of getting it inside every figure
+    :param tier: name of the tier in TIERS
+    :param static_dir: Streamlit's static folder, next to the app script
+    :param zip_path: path of the zipped FileGDB
+    :param layer_name: the layer to publish
+    :param cache_dir: directory of the prepared files
+    :return: the file's URL path, relative to the app
+    """
+    checksum = prepare_boundaries(zip_path, layer_name, cache_dir)
+    file_name = f"{layer_name}-{checksum}-{tier}.geojson"
+    path = os.path.join(static_dir, file_name)
+    if not os.path.exists(path):
+        os.makedirs(static_dir, exist_ok=True)
+        shutil.copyfile(_tier_path(cache_dir, layer_name, checksum, tier, "geojson"), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+    return f"app/static/{file_name}"
@@ -0,0 +1,112 @@
+"""
+The dataset behind the Merhav map page, derived from the crime records.
+
+It keeps only the columns the map filters and groups by, typed and dictionary
+encoded, with the Merhav names normalized to the boundaries' keys. It is
+written as Parquet once per data version, so later runs and restarts read a
+few compact columns instead of rebuilding it from the records.
+
+Sessions of different data versions can build their datasets at the same time,
+so the datasets are written and pruned under a lock on the directory, and the
+last KEEP_VERSIONS of them are kept for sessions still reading an older one.
+"""
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from merhav_names import normalize_merhav_name
+from shared_store import FRAME_FORMAT
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, writes are then not coordinated between processes
+    fcntl = None
+
+HEATMAP_DIR = os.environ.get("CRIME_HEATMAP_DIR", os.path.join(".cache", "heatmap"))
+KEEP_VERSIONS = 2  # datasets kept, so sessions on the previous version can still read theirs
+
+
+def build_heatmap_frame(df):
+    """
+    :param df: pandas df of crime records
+    :return: pandas df of the heatmap columns, int16 Year, categorical
+    StatisticGroup and normalized categorical PoliceMerhav
+    """
+    codes, names = pd.factorize(df["PoliceMerhav"])
+    keys = np.array([normalize_merhav_name(name) for name in names] + [None], dtype=object)
+    merhav = pd.Categorical(keys[codes])  # code -1 picks the trailing None
+    heatmap = pd.DataFrame({
+        "Year": df["Year"].to_numpy().astype("int16"),
+        "StatisticGroup": df["StatisticGroup"].astype("category").to_numpy(),
+        "PoliceMerhav": merhav,
+    })
+    return heatmap.dropna(subset=["PoliceMerhav"]).reset_index(drop=True)
+
+
+def _dataset_path(version, cache_dir):
+    # keyed by the format too, so a dataset built by older code isn't read
+    return os.path.join(cache_dir, f"heatmap-f{FRAME_FORMAT}-{version}.parquet")
+
+
+@contextmanager
+def _dataset_lock(cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "heatmap.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def write_heatmap_dataset(heatmap, version, cache_dir=HEATMAP_DIR):
+    """
+    Writes the dataset of a data version and drops all but the last
+    KEEP_VERSIONS ones, and those of any other format
+    :param heatmap: pandas df from build_heatmap_frame
+    :param version: the snapshot store's data version
+    :param cache_dir: directory of the datasets
+    :return: path of the written file
+    """
+    with _dataset_lock(cache_dir):
+        return _write_dataset(heatmap, version, cache_dir)
+
+
+def _write_dataset(heatmap, version, cache_dir):
+    path = _dataset_path(version, cache_dir)
+    heatmap.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+    # only finished datasets, never another writer's .tmp
+    written = [entry for entry in os.scandir(cache_dir)
+               if entry.name.startswith("heatmap-") and entry.name.endswith(".parquet")]
+    current = sorted((entry for entry in written if entry.name.startswith(f"heatmap-f{FRAME_FORMAT}-")),
+                     key=lambda entry: entry.stat().st_mtime)
+    stale = [entry for entry in written if not entry.name.startswith(f"heatmap-f{FRAME_FORMAT}-")]
+    for entry in stale + current[:-KEEP_VERSIONS]:
+        if entry.path != path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass  # removed by another process meanwhile
+    return path
+
+
+def load_heatmap_dataset(version, load_records, cache_dir=HEATMAP_DIR):
+    """
+    Reads the dataset of a data version, building it first if needed. Only one
+    process on the node builds it, the others wait for it.
+    :param version: the snapshot store's data version
+    :param load_records: function returning the crime records of that version
+    :param cache_dir: directory of the datasets
+    :return: pandas df from build_heatmap_frame
+    """
+    path = _dataset_path(version, cache_dir)
+    try:
+        return pd.read_parquet(path, memory_map=True)
+    except FileNotFoundError:
+        pass
+    with _dataset_lock(cache_dir):
+        if not os.path.exists(path):  # unless built by another process while waiting
+            _write_dataset(build_heatmap_frame(load_records()), version, cache_dir)
+        return pd.read_parquet(path, memory_map=True)
@@ -0,0 +1,256 @@
+"""
+Named spans timing the stages of every rerun of the app.
+
+A rerun is started with start_rerun and its stages are wrapped in span(), which
+records the wall time, whether the stage's data came from a cache, and the size
+of its payload. Spans nest, and code called inside a span, like the data
+service, can annotate it without knowing its name. finish_rerun folds the
+rerun's spans into process-wide metrics, which are exported as Prometheus text
+and as one JSON line per rerun when their environment variables are set:
+
+    CRIME_METRICS_PROM=/var/lib/node_exporter/crime_dashboard.prom   # textfile collector
+    CRIME_METRICS_JSONL=.cache/metrics/reruns.jsonl
+
+A single rerun can also be profiled, with pyinstrument's sampling profiler when
+it is installed and with cProfile otherwise. pyinstrument is imported by the
+first profile, so the app doesn't load it on startup.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_FILE = os.environ.get("CRIME_METRICS_PROM")
+JSONL_FILE = os.environ.get("CRIME_METRICS_JSONL")
+METRIC_PREFIX = "crime_dashboard"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds, of the span histogram
+PROFILE_INTERVAL = 0.001  # seconds between samples of the sampling profiler
+
+_local = threading.local()
+
+
+class Rerun:
+    """
+    The spans of one rerun of a page, in the order they started
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.time()
+        self.spans = []
+        self._start = time.perf_counter()
+        self._open = []  # the spans still running, innermost last
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+
+def start_rerun(page):
+    """
+    Starts recording the spans of a rerun on this thread, dropping a rerun
+    that was never finished
+    :param page: name of the page being rendered
+    :return: the rerun
+    """
+    _local.rerun = Rerun(page)
+    return _local.rerun
+
+
+def current_rerun():
+    """
+    :return: the rerun being recorded on this thread, or None
+    """
+    return getattr(_local, "rerun", None)
+
+
+@contextmanager
+def span(name):
+    """
+    Times a stage of the current rerun. The yielded dict can be given the
+    stage's "cache" outcome and payload "bytes". Outside of a rerun the stage
+    runs untimed.
+    :param name: name of the stage
+    """
+    rerun = current_rerun()
+    record = {"name": name, "cache": None, "bytes": None}
+    if rerun is None:
+        yield record
+        return
+    record["depth"] = len(rerun._open)
+    record["start"] = rerun.elapsed()
+    rerun.spans.append(record)
+    rerun._open.append(record)
+    try:
+        yield record
+    finally:
+        record["seconds"] = rerun.elapsed() - record["start"]
+        rerun._open.remove(record)
+
+
+def annotate(**attributes):
+    """
+    Sets attributes of the innermost running span that it doesn't have yet,
+    so when loads nest, the outermost one's outcome is kept
+    :param attributes: e.g. cache="hit"
+    """
+    rerun = current_rerun()
+    if rerun is None or not rerun._open:
+        return
+    record = rerun._open[-1]
+    for key, value in attributes.items():
+        if record.get(key) is None:
+            record[key] = value
+
+
+class Metrics:
+    """
+    Process-wide totals of the spans of every finished rerun
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.reruns = {}  # page -> count
+        self.spans = {}  # (page, span) -> {"count", "sum", "buckets", "bytes", "cache": {outcome: count}}
+        self._lock = threading.Lock()
+
+    def observe(self, rerun):
+        """
+        :param rerun: a finished rerun
+        """
+        with self._lock:
+            self.reruns[rerun.page] = self.reruns.get(rerun.page, 0) + 1
+            for record in rerun.spans:
+                entry = self.spans.setdefault((rerun.page, record["name"]), {
+                    "count": 0, "sum": 0.0, "buckets": [0] * len(self.buckets), "bytes": 0, "cache": {},
+                })
+                entry["count"] += 1
+                entry["sum"] += record["seconds"]
+                for i, bound in enumerate(self.buckets):
+                    if record["seconds"] <= bound:
+                        entry["buckets"][i] += 1
+                entry["bytes"] += record["bytes"] or 0
+                if record["cache"] is not None:
+                    entry["cache"][record["cache"]] = entry["cache"].get(record["cache"], 0) + 1
+
+    def prometheus_text(self):
+        """
+        :return: the metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            reruns = dict(self.reruns)
+            spans = {key: {**entry, "buckets": list(entry["buckets"]), "cache": dict(entry["cache"])}
+                     for key, entry in self.spans.items()}
+        name = f"{METRIC_PREFIX}_span_seconds"
+        lines = [
+            f"# HELP {METRIC_PREFIX}_reruns_total Reruns of every page.",
+            f"# TYPE {METRIC_PREFIX}_reruns_total counter",
+        ]
+        lines += [f"{METRIC_PREFIX}_reruns_total{_labels(page=page)} {count}" for page, count in reruns.items()]
+        lines += [f"# HELP {name} Wall time of the stages of a rerun.", f"# TYPE {name} histogram"]
+        for (page, span_name), entry in spans.items():
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                lines.append(f"{name}_bucket{_labels(page=page, span=span_name, le=bound)} {count}")
+            lines.append(f"{name}_bucket{_labels(page=page, span=span_name, le='+Inf')} {entry['count']}")
+            lines.append(f"{name}_sum{_labels(page=page, span=span_name)} {entry['sum']:.6f}")
+            lines.append(f"{name}_count{_labels(page=page, span=span_name)} {entry['count']}")
+        lines += [f"# HELP {METRIC_PREFIX}_span_cache_total Cache outcomes of the stages.",
+                  f"# TYPE {METRIC_PREFIX}_span_cache_total counter"]
+        lines += [f"{METRIC_PREFIX}_span_cache_total{_labels(page=page, span=span_name, result=outcome)} {count}"
+                  for (page, span_name), entry in spans.items() for outcome, count in entry["cache"].items()]
+        lines += [f"# HELP {METRIC_PREFIX}_span_bytes_total Bytes of the payloads of the stages.",
+                  f"# TYPE {METRIC_PREFIX}_span_bytes_total counter"]
+        lines += [f"{METRIC_PREFIX}_span_bytes_total{_labels(page=page, span=span_name)} {entry['bytes']}"
+                  for (page, span_name), entry in spans.items() if entry["bytes"]]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for key, value in labels.items()}
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+
+def rerun_json(rerun):
+    """
+    :param rerun: a finished rerun
+    :return: the rerun and its spans as one JSON line
+    """
+    spans = [{key: (round(value, 6) if isinstance(value, float) else value) for key, value in record.items()}
+             for record in rerun.spans]
+    return json.dumps({"time": round(rerun.started, 3), "page": rerun.page, "seconds": round(rerun.elapsed(), 6),
+                       "spans": spans}, ensure_ascii=False)
+
+
+_metrics = Metrics()
+_export_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    :return: the process's metrics
+    """
+    return _metrics
+
+
+def finish_rerun(prometheus_file=PROMETHEUS_FILE, jsonl_file=JSONL_FILE):
+    """
+    Stops recording the current rerun, adds it to the process's metrics and
+    exports them
+    :param prometheus_file: file rewritten with the Prometheus text, not written if None
+    :param jsonl_file: file the rerun is appended to as a JSON line, not written if None
+    :return: the finished rerun, or None if none was recorded
+    """
+    rerun = current_rerun()
+    if rerun is None:
+        return None
+    _local.rerun = None
+    _metrics.observe(rerun)
+    with _export_lock:
+        if jsonl_file:
+            os.makedirs(os.path.dirname(jsonl_file) or ".", exist_ok=True)
+            with open(jsonl_file, "a", encoding="utf-8") as f:
+                f.write(rerun_json(rerun) + "\n")
+        if prometheus_file:
+            os.makedirs(os.path.dirname(prometheus_file) or ".", exist_ok=True)
+            with open(f"{prometheus_file}.tmp", "w", encoding="utf-8") as f:
+                f.write(_metrics.prometheus_text())
+            os.replace(f"{prometheus_file}.tmp", prometheus_file)
+    return rerun
+
+
+def start_profiler(interval=PROFILE_INTERVAL):
+    """
+    Starts profiling the current thread
+    :param interval: seconds between samples, when sampling with pyinstrument
+    :return: the running profiler
+    """
+    try:
+        import pyinstrument
+    except ImportError:  # profiles are then taken with cProfile
+        pyinstrument = None
+    if pyinstrument is not None:
+        profiler = pyinstrument.Profiler(interval=interval)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler, limit=40):
+    """
+    :param profiler: a profiler from start_profiler
+    :param limit: number of functions in a cProfile report
+    :return: the profile as text
+    """
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+    profiler.stop()
+    return profiler.output_text(unicode=True, color=False)
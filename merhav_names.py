@@ -0,0 +1,93 @@
+"""
+Normalization of police Merhav names, and the join between crime records and
+the Merhav boundary polygons.
+
+The records name some Merhavim differently from the boundaries layer (with the
+district appended, or with stray line breaks). Every name is normalized to a
+canonical key once, and records are joined to polygons by integer code, so the
+map never compares strings at render time.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# record name -> boundaries name, for the names that differ between the two
+MERHAV_ALIASES = {
+    "מרחב איילון החדש תא": "מרחב איילון",
+    "מרחב איילון הישן תא": "מרחב איילון",
+    "מרחב אילת דרום": "מרחב אילת",
+    "מרחב אשר חוף": "מרחב אשר",
+    "מרחב יהודה שי": "מרחב יהודה",
+    "מרחב גליל צפון": "מרחב גליל",
+    "מרחב ירקון תא": "מרחב ירקון",
+    "מרחב דוד ירושלים": "מרחב דוד",
+    "מרחב שומרון שי": "מרחב שומרון",
+    "מרחב כרמל חוף": "מרחב כרמל",
+    "מרחב דן תא": "מרחב דן",
+    "מרחב קדם ירושלים": "מרחב קדם",
+    "מרחב ציון ירושלים": "מרחב ציון",
+    "מרחב כנרת צפון": "מרחב כנרת",
+    "מרחב עמקים צפון": "מרחב עמקים",
+    "מרחב נתבג מרכז": 'מרחב נתב"ג',
+    "מרחב מנשה חוף": "מרחב מנשה",
+}
+
+
+def normalize_merhav_name(name):
+    """
+    :param name: a Merhav name from the records or the boundaries
+    :return: the Merhav's canonical key, None for a missing name
+    """
+    if not isinstance(name, str):
+        return None
+    name = " ".join(name.replace("\r\n", " ").split())
+    if not name:
+        return None
+    return MERHAV_ALIASES.get(name, name)
+
+
+def build_merhav_index(boundary_names):
+    """
+    :param boundary_names: the MerhavName of every polygon, in polygon order
+    :return: pandas index of canonical keys, position i is polygon i
+    """
+    return pd.Index([normalize_merhav_name(name) for name in boundary_names], name="MerhavKey")
+
+
+def merhav_codes(names, merhav_index):
+    """
+    Joins Merhav names to polygons. Every distinct name is normalized once.
+    :param names: series of Merhav names from the records
+    :param merhav_index: index from build_merhav_index
+    :return: (int16 array of polygon positions, -1 where unmatched, sorted list of unmatched names)
+    """
+    codes, uniques = pd.factorize(names)
+    keys = [normalize_merhav_name(name) for name in uniques]
+    unique_codes = merhav_index.get_indexer(keys).astype("int16")
+    unmatched = sorted(str(name) for name, code in zip(uniques, unique_codes) if code == -1)
+    row_codes = np.where(codes == -1, -1, unique_codes[codes]).astype("int16")
+    return row_codes, unmatched
+
+
+def report_unmatched(unmatched):
+    """
+    Logs the record names that matched no polygon
+    :param unmatched: list of unmatched names from merhav_codes
+    """
+    if unmatched:
+        logger.warning("%d Merhav names match no boundary polygon: %s", len(unmatched), ", ".join(unmatched))
+
+
+def merhav_totals(codes, counts, polygon_count):
+    """
+    Sums counts per polygon
+    :param codes: polygon position of every row, -1 where unmatched
+    :param counts: count of every row
+    :param polygon_count: number of polygons
+    :return: float array of the total of every polygon
+    """
+    matched = codes >= 0
+    return np.bincount(codes[matched], weights=counts[matched], minlength=polygon_count)
@@ -0,0 +1,111 @@
+"""
+The map page: the offenses of every police Merhav, by offense type and year.
+"""
+import json
+
+import streamlit as st
+
+from app_data import load_heatmap_cube_for_version, load_merhav_table, load_version, show_figure
+from charts import ALL_CRIMES, ALL_MAP_YEARS, MAP_ZOOM, map_figure
+from geometry import load_geojson_bytes, publish_geojson, tier_for_zoom
+from instrumentation import annotate, span
+from prerender import read_figure
+
+
+@st.cache_resource
+def load_merhav_geojson(tier):
+    """
+    Publishes a simplified tier of the boundaries once per process
+    :param tier: name of the tier in geometry.TIERS
+    :return: URL of the tier's GeoJSON if static serving is on, otherwise its GeoJSON dict
+    """
+    annotate(cache="miss")
+    if st.get_option("server.enableStaticServing"):
+        return publish_geojson(tier)
+    return json.loads(load_geojson_bytes(tier))
+
+
+def render():
+    st.markdown(
+        """
+        <style>
+        /* Align dropdown menus to the right and reduce their width */
+        .stSelectbox > div {
+            direction: rtl; /* Make text right-to-left for Hebrew */
+            text-align: right; /* Align text inside the dropdown */
+            width: 200px; /* Reduce dropdown width */
+            margin-left: auto; /* Push dropdown to the right */
+            margin-right: 0; /* Remove extra margin */
+        }
+
+        /* Align titles and labels to the right */
+        .stText {
+            text-align: right; /* Align Streamlit text elements to the right */
+            direction: rtl; /* Right-to-left direction for Hebrew */
+        }
+        /* Align all text elements (labels, titles) to the right */
+        .stMarkdown, .stSelectbox label {
+            text-align: right; /* Align text to the right */
+            direction: rtl; /* Right-to-left direction for Hebrew */
+        }
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+    # Streamlit layout
+    st.title("מפת חום - עבירות משטרת ישראל")
+    st.markdown("""
+     <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.6;">
+     מפת החום מציגה את התפלגות הפשיעה במדינת ישראל בחלוקה לפי מרחבים משטרתיים. 
+     ניתן לראות את המידע בצורה ויזואלית ולהבין אילו מרחבים סובלים יותר מפשיעה, ובאילו סוגי עבירות. 
+
+     באמצעות הכלים האינטראקטיביים בדף זה, תוכלו לסנן את המידע לפי סוג העבירה והשנה המבוקשת, ולבחון את הפערים בין מרחבים שונים. 
+
+     </div>
+     """, unsafe_allow_html=True)
+
+    st.markdown("""
+     <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.8;">
+    <h3>מה כוללת כל קטגוריה בגרף?</h3>
+     <ul>
+         <li><strong>עבירות פליליות כלליות:</strong> עבירות כלפי הרכוש, עבירות נגד גוף, עבירות נגד אדם, עבירות מין.</li>
+         <li><strong>עבירות מוסר וסדר ציבורי:</strong> עבירות כלפי המוסר, עבירות סדר ציבורי.</li>
+         <li><strong>עבירות ביטחון:</strong> עבירות ביטחון.</li>
+         <li><strong>עבירות כלכליות ומנהליות:</strong> עבירות כלכליות, עבירות מנהליות, עבירות רשוי.</li>
+         <li><strong>עבירות תנועה:</strong> עבירות תנועה.</li>
+         <li><strong>עבירות מרמה:</strong> עבירות מרמה.</li>
+     </ul>
+     </div>
+     """, unsafe_allow_html=True)
+
+    with span("load_version"):
+        version, loaded_years = load_version()
+    with span("heatmap_cube"):
+        heatmap_cube = load_heatmap_cube_for_version(version, loaded_years)
+    with span("boundaries"):
+        gdf = load_merhav_table()  # shared by all sessions, read only
+        annotate(cache="hit")  # the function body didn't run
+
+    # Sort and prepare dropdown options
+    sorted_crimes = [ALL_CRIMES] + sorted(heatmap_cube['StatisticGroup'].unique())
+    years = [ALL_MAP_YEARS, 2020, 2021, 2022, 2023, 2024]
+
+    # Dropdowns for user selection
+    selected_crime = st.selectbox("בחר סוג עבירה:", options=sorted_crimes)
+    selected_year = st.selectbox("בחר שנה:", options=years)
+
+    # Prerendered maps point at the published GeoJSON, so they need static serving
+    fig = None
+    with span("map_figure"):
+        if st.get_option("server.enableStaticServing"):
+            fig = read_figure(version, "map", selected_crime, selected_year)
+        annotate(cache="artifact" if fig is not None else "miss")
+        if fig is None:
+            # Only the counts change between reruns, the boundaries are sent once
+            with span("geojson"):
+                geojson = load_merhav_geojson(tier_for_zoom(MAP_ZOOM))
+                annotate(cache="hit")  # the function body didn't run
+            fig = map_figure(heatmap_cube, gdf['unique_id'], gdf['MerhavName'], geojson, selected_crime, selected_year)
+    # Display the map
+    show_figure(fig)
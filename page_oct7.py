@@ -0,0 +1,92 @@
+"""
+The Oct-7 page: the offenses of every category per quarter, before and after
+the events of 7.10.2023, by police district.
+"""
+import streamlit as st
+
+from app_data import load_cube_for_version, load_version, show_figure
+from charts import oct7_counts, oct7_districts, oct7_figure
+from instrumentation import annotate, span
+from prerender import read_figure
+
+
+def render():
+    # Title
+    st.markdown(
+        '<h1 style="text-align: right; font-size: 36px; direction: rtl;">התפלגות עבירות לפני ואחרי ה-7.10</h1>',
+        unsafe_allow_html=True
+    )
+
+    st.markdown("""
+    <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.6;">
+    הנתונים המוצגים בעמוד זה מתמקדים בהשוואת הפשיעה לפני ואחרי אירועי ה-7 באוקטובר 2023. 
+    
+    הגרף מציג את כמות העבירות המנורמלת לרבעון, תוך חלוקה לסוגי עבירות עיקריים, ומאפשר זיהוי הבדלים במגמות לאורך הזמן. 
+    ניתן לסנן את המידע על פי מחוז משטרתי ולבחון כיצד הושפעו אזורים גיאוגרפיים שונים.
+
+    </div>
+    """, unsafe_allow_html=True)
+
+
+    st.markdown("""
+    <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.8;">
+    <h3>מה כוללת כל קטגוריה בגרף?</h3>
+    <ul>
+        <li><strong>עבירות פליליות כלליות:</strong> עבירות כלפי הרכוש, עבירות נגד גוף, עבירות נגד אדם, עבירות מין.</li>
+        <li><strong>עבירות מוסר וסדר ציבורי:</strong> עבירות כלפי המוסר, עבירות סדר ציבורי.</li>
+        <li><strong>עבירות ביטחון:</strong> עבירות ביטחון.</li>
+        <li><strong>עבירות כלכליות ומנהליות:</strong> עבירות כלכליות, עבירות מנהליות, עבירות רשוי.</li>
+        <li><strong>עבירות תנועה:</strong> עבירות תנועה.</li>
+        <li><strong>עבירות מרמה:</strong> עבירות מרמה.</li>
+    </ul>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("""
+        <style>
+        /* Style for the selectbox to reduce its width */
+        div[data-testid="stSelectbox"] > div {
+            width: 150px; /* Set the desired width for the dropdown */
+        }
+
+        /* Align the dropdown content */
+        div[data-testid="stSelectbox"] {
+            text-align: right;
+            direction: rtl;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+    # Load and process data
+    with span("load_version"):
+        version, loaded_years = load_version()
+    with span("oct7_counts"):
+        grouped = oct7_counts(load_cube_for_version(version, loaded_years))
+        districts = oct7_districts(grouped)
+
+    col1, col2 = st.columns([1, 3])  # Adjust the ratio to move the dropdown to the right
+
+    # Place the dropdown and label in the right column
+    with col2:
+        # Label for the dropdown
+        st.markdown("""
+            <div style="text-align: right; direction: rtl; font-size: 18px;">
+                בחר מחוז:
+            </div>
+        """, unsafe_allow_html=True)
+
+        # Dropdown menu
+        selected_district = st.selectbox(
+            "",
+            districts,  # List of districts
+            index=0,  # Default to "כל המחוזות"
+            key="district-selector"
+        )
+
+    # Prerendered after the data refresh, rendered here only if missing
+    with span("oct7_figure"):
+        fig = read_figure(version, "oct7", selected_district)
+        annotate(cache="artifact" if fig is not None else "miss")
+        if fig is None:
+            fig = oct7_figure(grouped, selected_district)
+
+    # Display bar chart
+    show_figure(fig)
@@ -0,0 +1,137 @@
+"""
+The overview page: the offenses of every category, per year or quarter, and
+their trend over the quarters.
+"""
+import streamlit as st
+
+from app_data import load_cube_for_version, load_series_for_version, load_version, show_figure
+from charts import ALL_YEARS, figure_bytes, overview_figure, trend_figure
+from instrumentation import annotate, span
+from prerender import read_artifact
+
+
+@st.cache_data(max_entries=32)
+def overview_chart_png(version, years, year_selected, split_by_quarter):
+    """
+    :param version: the snapshot store's data version
+    :param years: the years loaded so far
+    :param year_selected: a year, or ALL_YEARS
+    :param split_by_quarter: whether to split every bar by quarters
+    :return: PNG bytes of the overview chart, the least recently used are evicted
+    """
+    png = read_artifact(version, "overview", year_selected, split_by_quarter)
+    if png is not None:
+        annotate(cache="artifact")
+        return png
+    annotate(cache="miss")
+    return figure_bytes(overview_figure(load_cube_for_version(version, years), year_selected, split_by_quarter))
+
+
+def render():
+    st.title("פשיעה במדינת ישראל בשנים 2020-2024")
+
+    st.markdown("""
+    <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.6;">
+    ברוכים הבאים לדף לניתוח ויזואלי של נתוני הפשיעה במדינת ישראל בין השנים 2020–2024. 
+    דף זה נועד להציג תובנות ומגמות מתוך נתוני הפשיעה, תוך חלוקה לסוגי עבירות, מחוזות גיאוגרפיים והשפעתם של אירועים מרכזיים.
+
+    באמצעות כלי ניתוח אינטראקטיביים, תוכלו לבחון את ההתפלגויות השונות, להשוות בין תקופות זמן ולגלות תובנות חדשות על השינויים שחלו לאורך השנים. 
+    אנו מזמינים אתכם להשתמש בממשק זה לחקירה מעמיקה של נתוני הפשיעה בישראל ולקבלת תמונה רחבה ומדויקת יותר על הנושא.
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div style="text-align: right; direction: rtl; font-size: 18px; line-height: 1.8;">
+    <h3>מה כוללת כל קטגוריה בגרף?</h3>
+    <ul>
+        <li><strong>עבירות פליליות כלליות:</strong> עבירות כלפי הרכוש, עבירות נגד גוף, עבירות נגד אדם, עבירות מין.</li>
+        <li><strong>עבירות מוסר וסדר ציבורי:</strong> עבירות כלפי המוסר, עבירות סדר ציבורי.</li>
+        <li><strong>עבירות ביטחון:</strong> עבירות ביטחון.</li>
+        <li><strong>עבירות כלכליות ומנהליות:</strong> עבירות כלכליות, עבירות מנהליות, עבירות רשוי.</li>
+        <li><strong>עבירות תנועה:</strong> עבירות תנועה.</li>
+        <li><strong>עבירות מרמה:</strong> עבירות מרמה.</li>
+    </ul>
+    </div>
+    """, unsafe_allow_html=True)
+
+    with span("load_version"):
+        version, loaded_years = load_version()
+    with span("cube"):
+        cube = load_cube_for_version(version, loaded_years)
+    # OVERVIEW VISUALIZATION
+    # Determine Y-axis max value before filtering
+    years = [ALL_YEARS] + sorted(cube["Year"].dropna().unique().astype(int).tolist())
+    st.markdown("""
+        <style>
+        /* Align the selectbox text and menu to the right */
+        div[data-testid="stSelectbox"] * {
+            text-align: right !important; /* Align all text inside the dropdown */
+            direction: rtl !important;   /* Force right-to-left text direction */
+        }
+
+        /* Set a shorter width for the selectbox */
+        div[data-testid="stSelectbox"] > div {
+            width: 200px; 
+        }
+
+        /* Align the dropdown to the right */
+        div[data-testid="stSelectbox"] {
+            text-align: right;
+            direction: rtl;
+        }
+
+        /* Align checkbox text */
+        div[data-testid="stCheckbox"] * {
+            text-align: right !important;
+            direction: rtl !important;
+            padding-right: 2.5px !important; /* Add space before the text */
+
+
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
+    # Sidebar filters
+    year_selected = st.selectbox("בחר שנה:", years, index=0)
+
+    split_by_quarter = st.checkbox("חלוקה לרבעונים")
+
+    # Rendered once per data version and filter state, later reruns reuse the image
+    with span("overview_png") as stage:
+        png = overview_chart_png(version, loaded_years, year_selected, split_by_quarter)
+        annotate(cache="hit")  # the function body didn't run
+        stage["bytes"] = len(png)
+    with span("image"):
+        st.image(png, use_container_width=True)
+
+
+    ### next visualization
+    # Visualization
+    st.markdown("""
+     ### מגמות פשיעה לאורך זמן
+     .הגרף מציג את מגמות הפשיעה לאורך זמן בחלוקה לפי רבעונים. ניתן לסנן את סוגי העבירות בעזרת התיבות בצד ימין
+     """, unsafe_allow_html=True)
+
+    with span("series"):
+        series = load_series_for_version(version, loaded_years)
+
+    # Layout with columns
+    col1, col2 = st.columns([4, 1], gap="medium")  # Adjust ratio to prioritize graph width
+
+    with col2:
+        # Add vertical alignment to checkboxes
+        st.markdown("<div style='padding-top: 50px;'></div>", unsafe_allow_html=True)
+
+        # Filter data based on selected crime types
+        st.markdown("### :בחר סוגי עבירות")
+        crime_types = series.categories
+        selected_crime_types = []
+        for crime in crime_types:
+            if st.checkbox(crime, value=True):
+                selected_crime_types.append(crime)
+
+    with col1:
+        with span("trend_figure"):
+            fig = trend_figure(series, selected_crime_types)
+
+        show_figure(fig)
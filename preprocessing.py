@@ -0,0 +1,129 @@
+"""
+Preprocessing of the crime records shared by the dashboard pages.
+"""
+import numpy as np
+import pandas as pd
+
+from event_window import quarter_keys, window_periods
+
+# the 6 groups the statistic groups are divided into
+CATEGORIES = {
+    "עבירות פליליות כלליות": ['עבירות כלפי הרכוש', 'עבירות נגד גוף', 'עבירות נגד אדם', 'עבירות מין'],
+    "עבירות מוסר וסדר ציבורי": ['עבירות כלפי המוסר', 'עבירות סדר ציבורי'],
+    "עבירות ביטחון": ['עבירות בטחון'],
+    "עבירות כלכליות ומנהליות": ['עבירות כלכליות', 'עבירות מנהליות', 'עבירות רשוי'],
+    "עבירות תנועה": ['עבירות תנועה'],
+    "עבירות מרמה": ['עבירות מרמה']
+}
+
+# statistic group -> the category it belongs to
+STATISTIC_GROUP_TO_CATEGORY = {
+    stat_group: category for category, stat_groups in CATEGORIES.items() for stat_group in stat_groups
+}
+
+
+def categorize(stat_groups):
+    """
+    Categorizes a whole column at once. The column is encoded as a Categorical
+    so every distinct statistic group is looked up once, not once per row.
+    :param stat_groups: series of statistic groups
+    :return: categorical series of the 6 groups, NaN for uncategorized values
+    """
+    groups = pd.Categorical(stat_groups)
+    group_categories = pd.Categorical(
+        groups.categories.map(STATISTIC_GROUP_TO_CATEGORY), categories=list(CATEGORIES)
+    )
+    codes = np.where(groups.codes == -1, -1, group_categories.codes[groups.codes])
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=list(CATEGORIES)), index=stat_groups.index, name="Category"
+    )
+
+
+def reverse_labels(labels):
+    """
+    Reverses Hebrew labels for matplotlib, which draws them left to right.
+    Every distinct label is reversed once.
+    :param labels: categorical series of labels
+    :return: categorical series of the reversed labels
+    """
+    return labels.cat.rename_categories([label[::-1] for label in labels.cat.categories])
+
+
+def add_categories(df):
+    """
+    Adds the Category and ReversedStatisticGroup columns, and drops the rows
+    whose statistic group belongs to none of the 6 groups
+    :param df: pandas df of crime records
+    :return: pandas df with the category columns
+    """
+    df["Category"] = categorize(df["StatisticGroup"])
+    df = df.dropna(subset=["Category"])
+    df["ReversedStatisticGroup"] = reverse_labels(df["Category"])
+    return df
+
+
+# the Oct-7 page compares the quarters before and after the one of this date
+OCT7_DATE = "2023-10-07"
+BEFORE_OCT7 = "לפני ה7.10"
+AFTER_OCT7 = "אחרי ה7.10"
+
+
+def _map_distinct(values, func):
+    """
+    Applies func to every distinct value of a column instead of every row,
+    missing values included
+    :param values: series to map
+    :param func: function from an array of the distinct values to a new array
+    :return: numpy array of func's result for every row
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    mapped = np.asarray(func(uniques))
+    return mapped[codes]
+
+
+def build_analytics_frame(df):
+    """
+    Builds the analytics-ready frame all the pages read, once per data version:
+    small int Year/Quarter, categorical labels and the Oct-7 Period flag.
+    Pages must treat it as read-only.
+    :param df: pandas df of categorized crime records
+    :return: the analytics-ready pandas df
+    """
+    quarter = _map_distinct(
+        df["Quarter"],
+        lambda quarters: pd.to_numeric(
+            pd.Series(quarters, dtype=object).astype(str).str.extract(r"(\d)", expand=False), errors="coerce"
+        ).fillna(1).astype("int8"),
+    )
+    year = df["Year"].to_numpy().astype("int16")
+    valid = (quarter >= 1) & (quarter <= 4)  # Ensure valid quarters
+    df = df[valid]
+    year, quarter = year[valid], quarter[valid]
+
+    period = window_periods(quarter_keys(year, quarter), OCT7_DATE, labels=(BEFORE_OCT7, AFTER_OCT7))
+
+    return df.assign(
+        Year=year,
+        Quarter=quarter,
+        Period=period,
+        PoliceDistrict=df["PoliceDistrict"].astype("category"),
+        PoliceMerhav=df["PoliceMerhav"].astype("category"),
+    )
+
+
+def preprocess_data_district(df, keys=("Category", "Period")):
+    """
+    preprocessed the districts names
+    :param df: out data frame
+    :param keys: the columns besides PoliceDistrict the counts are grouped by
+    :return: pandas df with the district names preprocessed
+    """
+    # remove nan values
+    filtered_df = df[~df["PoliceDistrict"].isin(["כל הארץ", ""])]
+
+    # make a joined district
+    aggregated_df = filtered_df.groupby(list(keys), observed=True).agg({"Count": "sum"}).reset_index()
+    aggregated_df["PoliceDistrict"] = "כל המחוזות"
+    combined_df = pd.concat([filtered_df, aggregated_df], ignore_index=True)
+
+    return combined_df
@@ -0,0 +1,273 @@
+"""
+Ahead-of-time rendering of every variant of the dashboard's charts.
+
+The filters of every page have a small, known set of values, so after each data
+refresh every variant is rendered in a process pool: the overview's images and
+the Plotly JSON of the Oct-7 and map figures. They are written to an artifact
+store, one directory per data version, and the app only reads them. A variant
+missing from the store is rendered by the app as before.
+
+The store is keyed by the data version and by RENDER_FORMAT, which is bumped
+with every change to the charts, so artifacts of old chart code are never
+served. Every server process asks for a render after a refresh, but only one
+process of the node renders a version at a time: the others find the lock
+held, or the version complete, and skip it before building any of its inputs.
+
+    python prerender.py               # render the current data version
+    python prerender.py --workers 4
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import plotly.io as pio
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where renders aren't coordinated between processes
+    fcntl = None
+
+from charts import (ALL_CRIMES, ALL_MAP_YEARS, ALL_YEARS, MAP_ZOOM, figure_bytes, map_figure, oct7_counts,
+                    oct7_districts, oct7_figure, overview_figure, trend_figure)
+from cube import build_cube
+from dataset import build_heatmap_cube, load_analytics_frame
+from geometry import load_boundaries, publish_geojson, tier_for_zoom
+from snapshot_store import data_version, ensure_snapshots
+from timeseries import QuarterlySeries
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.environ.get("CRIME_ARTIFACT_DIR", os.path.join(".cache", "artifacts"))
+KEEP_VERSIONS = 2  # versions kept in the store, so sessions on the previous one still find theirs
+RENDER_FORMAT = 2  # bumped with every change to the charts or their serialization
+MAX_WORKERS = min(4, os.cpu_count() or 1)  # render processes, beside the app's own
+
+EXTENSIONS = {"overview": "png", "oct7": "json", "map": "json"}
+
+
+def artifact_name(kind, *key):
+    """
+    :param kind: the chart, a key of EXTENSIONS
+    :param key: the filter values of the variant
+    :return: file name of the variant in the artifact store
+    """
+    digest = hashlib.sha1(json.dumps(key, ensure_ascii=False).encode()).hexdigest()[:16]
+    return f"{kind}-{digest}.{EXTENSIONS[kind]}"
+
+
+def _version_dir(version, cache_dir):
+    return os.path.join(cache_dir, f"r{RENDER_FORMAT}-{version}")
+
+
+def read_artifact(version, kind, *key, cache_dir=ARTIFACT_DIR):
+    """
+    :param version: the snapshot store's data version
+    :param kind: the chart, a key of EXTENSIONS
+    :param key: the filter values of the variant
+    :param cache_dir: root of the artifact store
+    :return: the variant's bytes, or None if it wasn't prerendered
+    """
+    try:
+        with open(os.path.join(_version_dir(version, cache_dir), artifact_name(kind, *key)), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def read_figure(version, kind, *key, cache_dir=ARTIFACT_DIR):
+    """
+    :param version: the snapshot store's data version
+    :param kind: a Plotly chart, a key of EXTENSIONS
+    :param key: the filter values of the variant
+    :param cache_dir: root of the artifact store
+    :return: the variant's Plotly figure, or None if it wasn't prerendered
+    """
+    data = read_artifact(version, kind, *key, cache_dir=cache_dir)
+    return None if data is None else pio.from_json(data.decode("utf-8"))
+
+
+def chart_variants(cube, heatmap_cube):
+    """
+    :param cube: the count cube
+    :param heatmap_cube: the heatmap cube
+    :return: list of (kind, key) of every variant of every chart
+    """
+    years = sorted(cube["Year"].dropna().unique().astype(int).tolist())
+    variants = [("overview", (year, split)) for year in [ALL_YEARS] + years for split in (False, True)]
+    variants += [("oct7", (district,)) for district in oct7_districts(oct7_counts(cube))]
+    crimes = [ALL_CRIMES] + sorted(heatmap_cube["StatisticGroup"].unique())
+    map_years = [ALL_MAP_YEARS] + sorted(heatmap_cube["Year"].unique().astype(int).tolist())
+    variants += [("map", (crime, year)) for crime in crimes for year in map_years]
+    return variants
+
+
+# the inputs of the charts, set once in every worker process
+_worker = {}
+
+
+def init_worker(cube, heatmap_cube, ids, names, geojson):
+    """
+    Sets the inputs of the charts of a worker process
+    :param cube: the count cube
+    :param heatmap_cube: the heatmap cube
+    :param ids: unique_id of every polygon
+    :param names: MerhavName of every polygon
+    :param geojson: the boundaries' GeoJSON dict, or its URL
+    """
+    _worker.update(cube=cube, heatmap_cube=heatmap_cube, ids=ids, names=names, geojson=geojson,
+                   oct7=oct7_counts(cube), series=QuarterlySeries.from_cube(cube))
+
+
+def variant_figure(kind, key):
+    """
+    Builds a variant's figure from the inputs set by init_worker
+    :param kind: the chart, a key of EXTENSIONS, or "trend" with the categories drawn as the key
+    :param key: the filter values of the variant
+    :return: matplotlib figure of the overview, to be closed by the caller, plotly figure otherwise
+    """
+    if kind == "overview":
+        return overview_figure(_worker["cube"], *key)
+    if kind == "trend":
+        return trend_figure(_worker["series"], key)
+    if kind == "oct7":
+        return oct7_figure(_worker["oct7"], *key)
+    return map_figure(_worker["heatmap_cube"], _worker["ids"], _worker["names"], _worker["geojson"], *key)
+
+
+def render_variant(variant):
+    """
+    Renders a variant in a worker process
+    :param variant: (kind, key) from chart_variants
+    :return: (file name, bytes) of the variant
+    """
+    kind, key = variant
+    fig = variant_figure(kind, key)
+    data = figure_bytes(fig) if kind == "overview" else fig.to_json().encode("utf-8")
+    return artifact_name(kind, *key), data
+
+
+@contextmanager
+def _render_lock(version_dir, cache_dir):
+    """
+    Takes the node's render lock without waiting for it
+    :param version_dir: directory of the version to render
+    :param cache_dir: root of the artifact store
+    :return: context manager yielding whether the version is left to render by
+    this process: False if it was rendered or another process holds the lock
+    """
+    if os.path.isdir(version_dir):
+        yield False
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, "prerender.lock"), "w") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False  # another process is rendering
+                return
+        yield not os.path.isdir(version_dir)  # unless rendered by another process meanwhile
+
+
+def prerender(version, cube, heatmap_cube, ids, names, geojson, max_workers=MAX_WORKERS, cache_dir=ARTIFACT_DIR):
+    """
+    Renders every variant of a data version into the artifact store, unless
+    the version was already rendered or another process of the node is
+    rendering. The version's directory appears only once all of its variants
+    are written.
+    :param version: the snapshot store's data version
+    :param cube: the count cube
+    :param heatmap_cube: the heatmap cube
+    :param ids: unique_id of every polygon
+    :param names: MerhavName of every polygon
+    :param geojson: URL of the boundaries' GeoJSON
+    :param max_workers: number of worker processes
+    :param cache_dir: root of the artifact store
+    :return: number of rendered variants
+    """
+    version_dir = _version_dir(version, cache_dir)
+    with _render_lock(version_dir, cache_dir) as render:
+        if not render:
+            return 0
+        return _render_version(version_dir, cube, heatmap_cube, ids, names, geojson, max_workers, cache_dir)
+
+
+def _render_version(version_dir, cube, heatmap_cube, ids, names, geojson, max_workers, cache_dir):
+    tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    variants = chart_variants(cube, heatmap_cube)
+    # spawn, as forking the multi-threaded app server is unsafe
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker,
+                             initargs=(cube, heatmap_cube, list(ids), list(names), geojson)) as pool:
+        for name, data in pool.map(render_variant, variants, chunksize=4):
+            with open(os.path.join(tmp_dir, name), "wb") as f:
+                f.write(data)
+
+    try:
+        os.rename(tmp_dir, version_dir)
+    except OSError:  # rendered by another process meanwhile, without locks
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    # versions of older chart code are dropped, as they are never read again
+    current = f"r{RENDER_FORMAT}-"
+    entries = [entry for entry in os.scandir(cache_dir) if entry.is_dir() and ".tmp-" not in entry.name]
+    versions = sorted((entry for entry in entries if entry.name.startswith(current)),
+                      key=lambda entry: entry.stat().st_mtime)
+    stale = [entry for entry in entries if not entry.name.startswith(current)]
+    for entry in stale + versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return len(variants)
+
+
+def build_inputs(version):
+    """
+    Builds the inputs of the charts from the snapshot store
+    :param version: the snapshot store's current data version
+    :return: (count cube, heatmap cube, boundaries gdf)
+    """
+    frame = load_analytics_frame()
+    gdf = load_boundaries()
+    return build_cube(frame), build_heatmap_cube(version, lambda: frame, gdf['MerhavName']), gdf
+
+
+def prerender_current(max_workers=MAX_WORKERS, cache_dir=ARTIFACT_DIR):
+    """
+    Builds the cubes of the snapshot store's current data version and renders
+    all of its variants, unless it was rendered or another process of the
+    node is rendering
+    :param max_workers: number of worker processes
+    :param cache_dir: root of the artifact store
+    :return: number of rendered variants
+    """
+    ensure_snapshots()
+    version = data_version()
+    version_dir = _version_dir(version, cache_dir)
+    # the lock is taken before the inputs are built, so only the process that renders builds them
+    with _render_lock(version_dir, cache_dir) as render:
+        if not render:
+            return 0
+        cube, heatmap_cube, gdf = build_inputs(version)
+        count = _render_version(version_dir, cube, heatmap_cube, gdf['unique_id'], gdf['MerhavName'],
+                                publish_geojson(tier_for_zoom(MAP_ZOOM)), max_workers, cache_dir)
+    logger.info("prerendered %d chart variants of data version %s", count, version)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every chart variant of the current data version")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="worker processes")
+    args = parser.parse_args()
+
+    print(f"{prerender_current(args.workers)} chart variants rendered")
+
+
+if __name__ == "__main__":
+    main()
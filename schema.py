@@ -0,0 +1,76 @@
+"""
+The schema of the crime records, applied when they are ingested.
+
+The API returns about 20 columns per record as Python strings. The dashboards
+read a handful of them, most of which repeat a few dozen labels, so only those
+are kept: labels as categoricals and numbers as the smallest int that fits.
+"""
+import pandas as pd
+
+# column -> dtype, of the API columns the dashboards read. Every other column is dropped.
+RECORD_SCHEMA = {
+    "_id": "int64",
+    "Year": "int16",
+    "Quarter": "category",
+    "PoliceDistrict": "category",
+    "PoliceMerhav": "category",
+    "StatisticGroup": "category",
+}
+
+
+def apply_schema(df, schema=RECORD_SCHEMA):
+    """
+    Keeps the schema's columns and casts them to its dtypes. Int columns with
+    missing values become the matching nullable int.
+    :param df: pandas df of records
+    :param schema: dict of column -> dtype
+    :return: pandas df of the schema's columns that df has
+    """
+    columns = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype.startswith("int"):
+            values = pd.to_numeric(values, errors="coerce")
+            if values.isna().any():
+                dtype = dtype.capitalize()
+        columns[column] = values.astype(dtype)
+    return pd.DataFrame(columns, index=df.index)
+
+
+def concat_frames(frames, schema=RECORD_SCHEMA):
+    """
+    Concatenates frames in the schema without going through object columns:
+    every frame is reindexed to the schema's columns that any of them has, the
+    missing ones empty, and the categories of every categorical column are
+    unified first.
+    :param frames: list of pandas dfs in the schema
+    :param schema: dict of column -> dtype
+    :return: pandas df of all the frames' rows
+    """
+    frames = [df for df in frames if len(df.columns)]
+    if not frames:
+        return apply_schema(pd.DataFrame(columns=list(schema)), schema)
+    columns = [column for column in schema if any(column in df.columns for df in frames)]
+    frames = [df[columns] if set(columns) <= set(df.columns) else apply_schema(df.reindex(columns=columns), schema)
+              for df in frames]
+    for column in columns:
+        if schema[column] != "category":
+            continue
+        categories = pd.Index([])
+        for df in frames:
+            categories = categories.union(df[column].cat.categories)
+        frames = [df.assign(**{column: df[column].cat.set_categories(categories)}) for df in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(df):
+    """
+    :param df: pandas df
+    :return: pandas df of the dtype and MB of every column, and the total
+    """
+    memory = df.memory_usage(deep=True, index=False) / 2 ** 20
+    report = pd.DataFrame({"dtype": df.dtypes.astype(str), "MB": memory.round(2)})
+    report.loc["total"] = ["", round(memory.sum(), 2)]
+    return report
@@ -0,0 +1,111 @@
+"""
+Frames published once per node as Arrow IPC files, attached by every process.
+
+When several app processes run on one node, the first to need a frame of a
+data version builds it and writes it as an uncompressed Arrow IPC file; the
+others memory-map that file instead of building their own copy. Mapped pages
+live in the OS page cache and are shared by all the processes, so memory stays
+flat as workers are added and a new worker starts without loading anything.
+By default the store is under /dev/shm, which is backed by memory.
+
+The store outlives a deploy, so a file is keyed by the frame's format as well as
+the data version. FRAME_FORMAT is bumped whenever the code building the frames
+changes what they hold, so new processes build their frames again instead of
+attaching the old ones, which are dropped with the next publish.
+"""
+import os
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, builds are then not coordinated between processes
+    fcntl = None
+
+_DEFAULT_DIR = os.path.join("/dev/shm", "crime-dashboard") if os.path.isdir("/dev/shm") \
+    else os.path.join(".cache", "shared")
+SHARED_DIR = os.environ.get("CRIME_SHARED_DIR", _DEFAULT_DIR)
+KEEP_VERSIONS = 2  # versions kept per frame, so processes on the previous one can still attach
+FRAME_FORMAT = 2  # bumped with every change to what the published frames hold
+
+
+def _frame_path(name, version, shared_dir, frame_format):
+    return os.path.join(shared_dir, f"{name}-f{frame_format}-{version}.arrow")
+
+
+def publish_frame(name, version, df, shared_dir=SHARED_DIR, frame_format=FRAME_FORMAT):
+    """
+    Writes a frame to the store and drops the older versions of it, and its
+    files of any other format. Processes that still map a dropped file keep
+    reading it until they let go.
+    :param name: name of the frame
+    :param version: the data version it was built from
+    :param df: pandas df to publish
+    :param shared_dir: directory of the store
+    :param frame_format: format of the frame, FRAME_FORMAT
+    :return: path of the published file
+    """
+    os.makedirs(shared_dir, exist_ok=True)
+    path = _frame_path(name, version, shared_dir, frame_format)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(f"{path}.tmp", "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(f"{path}.tmp", path)
+
+    published = [entry for entry in os.scandir(shared_dir)
+                 if entry.name.startswith(f"{name}-") and entry.name.endswith(".arrow")]
+    current = sorted((entry for entry in published if entry.name.startswith(f"{name}-f{frame_format}-")),
+                     key=lambda entry: entry.stat().st_mtime)
+    stale = [entry for entry in published if not entry.name.startswith(f"{name}-f{frame_format}-")]
+    for entry in stale + current[:-KEEP_VERSIONS]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass  # still mapped, on systems that don't allow removing it
+    return path
+
+
+def attach_frame(name, version, shared_dir=SHARED_DIR, frame_format=FRAME_FORMAT):
+    """
+    Maps a published frame into the process without reading it
+    :param name: name of the frame
+    :param version: the data version it was built from
+    :param shared_dir: directory of the store
+    :param frame_format: format of the frame, FRAME_FORMAT
+    :return: pandas df backed by the mapped file where its types allow, or None if it wasn't published
+    """
+    path = _frame_path(name, version, shared_dir, frame_format)
+    try:
+        source = pa.memory_map(path)
+    except (FileNotFoundError, pa.ArrowIOError):
+        return None
+    table = ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def shared_frame(name, version, build, shared_dir=SHARED_DIR, frame_format=FRAME_FORMAT):
+    """
+    Attaches to a published frame, or builds and publishes it first. Only one
+    process on the node builds a frame, the others wait for it.
+    :param name: name of the frame
+    :param version: the data version it is built from
+    :param build: function building the frame
+    :param shared_dir: directory of the store
+    :param frame_format: format of the frame, FRAME_FORMAT
+    :return: pandas df of the frame
+    """
+    df = attach_frame(name, version, shared_dir, frame_format)
+    if df is not None:
+        return df
+
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, f"{name}.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        df = attach_frame(name, version, shared_dir, frame_format)  # built by another process while waiting
+        if df is None:
+            publish_frame(name, version, build(), shared_dir, frame_format)
+            df = attach_frame(name, version, shared_dir, frame_format)
+    return df
@@ -0,0 +1,378 @@
+"""
+Versioned on-disk snapshots of the crime records, one directory per resource.
+
+A snapshot is keyed by its resource id and the API's last-modified time. Closed
+years never change, so once downloaded their snapshot is frozen. The live year
+is refreshed incrementally: only the records past the last seen _id are fetched
+and written as a new part file next to the existing ones. Within the TTL the
+store is read without touching the network, and when the API can't be reached
+the last snapshot is served no matter how old it is.
+
+Every write to a resource's snapshot, and a refresh from reading its manifest
+to appending the delta, holds an exclusive lock on the resource's lock file,
+so refreshes running at once in several threads or processes of the node,
+like the app's workers and the refresh command, never append the same records.
+
+    python snapshot_store.py refresh          # refresh the live year
+    python snapshot_store.py invalidate 2024  # drop the 2024 snapshot
+    python snapshot_store.py report           # memory footprint of every year
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow.parquet as pq
+import requests
+
+from ckan_client import BASE_URL, RESOURCES, fetch_frames, fetch_last_modified, fetch_new_frame, get_session
+from schema import RECORD_SCHEMA, apply_schema, memory_report
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where writes to a snapshot aren't locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("CRIME_CACHE_DIR", os.path.join(".cache", "crime_snapshots"))
+SNAPSHOT_VERSION = 2
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+REFRESH_INTERVAL = 60 * 60  # seconds, keep below DEFAULT_TTL
+LIVE_YEAR = max(RESOURCES)  # the only year whose resource still changes
+MAX_PARTS = 20  # delta parts kept before they are compacted into one file
+
+
+def _resource_dir(resource_id, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, resource_id)
+
+
+@contextmanager
+def _resource_lock(resource_id, cache_dir=CACHE_DIR):
+    # next to the resource's directory, so it outlives invalidating the resource
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{resource_id}.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _write_part(resource_dir, df, last_modified):
+    key = hashlib.sha1(f"{last_modified}-{time.time()}".encode()).hexdigest()[:12]
+    file_name = f"v{SNAPSHOT_VERSION}-{key}.parquet"
+    tmp_path = os.path.join(resource_dir, f"{file_name}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(resource_dir, file_name))
+    return file_name
+
+
+def _read_part(path):
+    # snapshots written before the schema still have every API column, read only the schema's
+    columns = [column for column in RECORD_SCHEMA if column in pq.read_schema(path).names]
+    return apply_schema(pd.read_parquet(path, columns=columns, memory_map=True))
+
+
+def read_manifest(resource_id, cache_dir=CACHE_DIR):
+    """
+    :param resource_id: the CKAN resource id
+    :param cache_dir: root of the snapshot store
+    :return: the snapshot's manifest dict, or None if there is no usable snapshot
+    """
+    resource_dir = _resource_dir(resource_id, cache_dir)
+    try:
+        with open(os.path.join(resource_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        return None
+    if not all(os.path.exists(os.path.join(resource_dir, name)) for name in manifest["files"]):
+        return None
+    return manifest
+
+
+def is_fresh(manifest, ttl=DEFAULT_TTL):
+    """
+    :param manifest: a snapshot manifest
+    :param ttl: seconds a snapshot is trusted without asking the API
+    :return: True if the snapshot is younger than the TTL
+    """
+    return manifest is not None and time.time() - manifest["checked_at"] < ttl
+
+
+def read_snapshot(resource_id, cache_dir=CACHE_DIR):
+    """
+    Reads a snapshot, memory-mapping its Parquet files
+    :param resource_id: the CKAN resource id
+    :param cache_dir: root of the snapshot store
+    :return: pandas df of the snapshot, or None if there is none
+    """
+    resource_dir = _resource_dir(resource_id, cache_dir)
+    for _ in range(3):
+        manifest = read_manifest(resource_id, cache_dir)
+        if manifest is None:
+            return None
+        try:
+            parts = [_read_part(os.path.join(resource_dir, name)) for name in manifest["files"]]
+        except FileNotFoundError:
+            continue  # compacted by a refresh while reading, read the new manifest
+        # parts may have different categories, so the schema is applied to the whole
+        return parts[0] if len(parts) == 1 else apply_schema(pd.concat(parts, ignore_index=True))
+    return None
+
+
+def write_snapshot(resource_id, df, last_modified, cache_dir=CACHE_DIR):
+    """
+    Writes a new snapshot of a resource and drops the older one
+    :param resource_id: the CKAN resource id
+    :param df: pandas df of the resource's records
+    :param last_modified: the API's last-modified time of the resource
+    :param cache_dir: root of the snapshot store
+    :return: the new manifest
+    """
+    with _resource_lock(resource_id, cache_dir):
+        return _write_snapshot(resource_id, df, last_modified, cache_dir)
+
+
+def _write_snapshot(resource_id, df, last_modified, cache_dir):
+    resource_dir = _resource_dir(resource_id, cache_dir)
+    os.makedirs(resource_dir, exist_ok=True)
+    file_name = _write_part(resource_dir, df, last_modified)
+
+    now = time.time()
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "resource_id": resource_id,
+        "last_modified": last_modified,
+        "files": [file_name],
+        "rows": len(df),
+        "last_id": int(df["_id"].max()) if len(df) else 0,
+        "fetched_at": now,
+        "checked_at": now,
+    }
+    _write_json_atomic(os.path.join(resource_dir, "manifest.json"), manifest)
+
+    for name in os.listdir(resource_dir):
+        if name.endswith(".parquet") and name != file_name:
+            os.remove(os.path.join(resource_dir, name))
+    return manifest
+
+
+def append_snapshot(resource_id, df, last_modified, cache_dir=CACHE_DIR):
+    """
+    Adds new records to a snapshot as a part file, without rewriting the
+    records already on disk. Parts are compacted once there are too many.
+    :param resource_id: the CKAN resource id
+    :param df: pandas df of the new records
+    :param last_modified: the API's last-modified time of the resource
+    :param cache_dir: root of the snapshot store
+    :return: the updated manifest
+    """
+    with _resource_lock(resource_id, cache_dir):
+        return _append_snapshot(resource_id, df, last_modified, cache_dir)
+
+
+def _append_snapshot(resource_id, df, last_modified, cache_dir):
+    manifest = read_manifest(resource_id, cache_dir)
+    # records the snapshot already has are never appended twice
+    df = df[df["_id"] > manifest["last_id"]].drop_duplicates("_id")
+    if len(manifest["files"]) >= MAX_PARTS:
+        full_df = pd.concat([read_snapshot(resource_id, cache_dir), df], ignore_index=True)
+        return _write_snapshot(resource_id, full_df, last_modified, cache_dir)
+
+    resource_dir = _resource_dir(resource_id, cache_dir)
+    now = time.time()
+    if len(df):
+        manifest["files"].append(_write_part(resource_dir, df, last_modified))
+        manifest["rows"] += len(df)
+        manifest["last_id"] = max(manifest["last_id"], int(df["_id"].max()))
+        manifest["fetched_at"] = now
+    manifest["last_modified"] = last_modified
+    manifest["checked_at"] = now
+    _write_json_atomic(os.path.join(resource_dir, "manifest.json"), manifest)
+    return manifest
+
+
+def touch_snapshot(resource_id, cache_dir=CACHE_DIR):
+    """
+    Marks a snapshot as checked against the API just now
+    :param resource_id: the CKAN resource id
+    :param cache_dir: root of the snapshot store
+    """
+    with _resource_lock(resource_id, cache_dir):
+        _touch_snapshot(resource_id, cache_dir)
+
+
+def _touch_snapshot(resource_id, cache_dir):
+    manifest = read_manifest(resource_id, cache_dir)
+    if manifest is not None:
+        manifest["checked_at"] = time.time()
+        _write_json_atomic(os.path.join(_resource_dir(resource_id, cache_dir), "manifest.json"), manifest)
+
+
+def invalidate(resource_id=None, cache_dir=CACHE_DIR):
+    """
+    Removes the snapshot of one resource, or of all of them. This is the only
+    way a closed year is downloaded again.
+    :param resource_id: the CKAN resource id, None for every resource
+    :param cache_dir: root of the snapshot store
+    """
+    path = cache_dir if resource_id is None else _resource_dir(resource_id, cache_dir)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def snapshot_key(resource_id, cache_dir=CACHE_DIR):
+    """
+    :param resource_id: the CKAN resource id
+    :param cache_dir: root of the snapshot store
+    :return: a key that changes whenever the resource's snapshot changes
+    """
+    manifest = read_manifest(resource_id, cache_dir)
+    return ",".join(manifest["files"]) if manifest else ""
+
+
+def data_version(resources=RESOURCES, cache_dir=CACHE_DIR):
+    """
+    :param resources: dict of year -> resource id
+    :param cache_dir: root of the snapshot store
+    :return: a key that changes whenever any of the snapshots changes
+    """
+    keys = [snapshot_key(resource_id, cache_dir) for resource_id in resources.values()]
+    return hashlib.sha1("|".join(keys).encode()).hexdigest()[:12]
+
+
+def refresh_resource(resource_id, cache_dir=CACHE_DIR, base_url=BASE_URL):
+    """
+    Brings a snapshot up to date with the API. When the resource changed, only
+    the records past the last seen _id are fetched and appended. If records
+    held were deleted or rewritten upstream, or the counts don't add up, the
+    resource is downloaded again in full.
+    :param resource_id: the CKAN resource id
+    :param cache_dir: root of the snapshot store
+    :param base_url: the CKAN action API url
+    :return: number of new records
+    """
+    session = get_session()
+    with _resource_lock(resource_id, cache_dir):
+        # read under the lock, so what a refresh that held it meanwhile wrote is seen
+        manifest = read_manifest(resource_id, cache_dir)
+        last_modified = fetch_last_modified(session, resource_id, base_url)
+        if manifest is not None and manifest["last_modified"] == last_modified:
+            _touch_snapshot(resource_id, cache_dir)
+            return 0
+
+        if manifest is not None:
+            records, total = fetch_new_frame(
+                session, resource_id, manifest["last_id"], manifest["rows"], base_url=base_url
+            )
+            if records is not None and manifest["rows"] + len(records) == total:
+                _append_snapshot(resource_id, records, last_modified, cache_dir)
+                return len(records)
+            logger.info("records of %s changed upstream, downloading it again", resource_id)
+
+        records = fetch_frames(resources={"": resource_id}, base_url=base_url, session=session)[""]
+        _write_snapshot(resource_id, records, last_modified, cache_dir)
+        return len(records)
+
+
+def ensure_snapshots(resources=RESOURCES, ttl=DEFAULT_TTL, cache_dir=CACHE_DIR, base_url=BASE_URL):
+    """
+    Makes sure every year has a snapshot. Missing years are downloaded, and the
+    live year is refreshed incrementally once past the TTL.
+    :param resources: dict of year -> resource id
+    :param ttl: seconds a snapshot is trusted without asking the API
+    :param cache_dir: root of the snapshot store
+    :param base_url: the CKAN action API url
+    """
+    session = get_session()
+    missing = {}
+    for year, resource_id in resources.items():
+        manifest = read_manifest(resource_id, cache_dir)
+        if manifest is None:
+            missing[year] = resource_id
+        elif year == LIVE_YEAR and not is_fresh(manifest, ttl):
+            try:
+                refresh_resource(resource_id, cache_dir, base_url)
+            except requests.RequestException:
+                pass  # offline, serve the old snapshot
+
+    if missing:
+        last_modified = {
+            year: fetch_last_modified(session, resource_id, base_url) for year, resource_id in missing.items()
+        }
+        for year, records in fetch_frames(resources=missing, base_url=base_url, session=session).items():
+            write_snapshot(missing[year], records, last_modified[year], cache_dir)
+
+
+def start_background_refresh(interval=REFRESH_INTERVAL, resource_id=RESOURCES[LIVE_YEAR],
+                             cache_dir=CACHE_DIR, base_url=BASE_URL, on_change=None):
+    """
+    Refreshes the live year on a daemon thread every `interval` seconds, so
+    the dashboard never waits on the API when it reads the store
+    :param interval: seconds between refreshes
+    :param resource_id: the CKAN resource id of the live year
+    :param cache_dir: root of the snapshot store
+    :param base_url: the CKAN action API url
+    :param on_change: function called on the thread after the first round and
+    after every round that brought new records
+    :return: an event that stops the refresh loop when set
+    """
+    stop = threading.Event()
+
+    def refresh_loop():
+        first_round = True
+        while not stop.is_set():
+            try:
+                changed = refresh_resource(resource_id, cache_dir, base_url) > 0
+            except requests.RequestException:
+                changed = False  # try again on the next round
+            if on_change is not None and (changed or first_round):
+                try:
+                    on_change()
+                except Exception:
+                    logger.exception("refresh callback failed")
+            first_round = False
+            stop.wait(interval)
+
+    threading.Thread(target=refresh_loop, name="snapshot-refresh", daemon=True).start()
+    return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the crime records snapshot store")
+    parser.add_argument("action", choices=["refresh", "invalidate", "report"])
+    parser.add_argument("years", nargs="*", help="years to act on, the live year by default for refresh "
+                                                 "and all years otherwise")
+    args = parser.parse_args()
+
+    if args.action == "invalidate":
+        for year in args.years or RESOURCES:
+            invalidate(RESOURCES[year])
+    elif args.action == "report":
+        for year in args.years or RESOURCES:
+            df = read_snapshot(RESOURCES[year])
+            print(f"{year}: no snapshot" if df is None else f"{year}: {len(df)} records\n{memory_report(df)}\n")
+    else:
+        for year in args.years or [LIVE_YEAR]:
+            print(f"{year}: {refresh_resource(RESOURCES[year])} new records")
+
+
+if __name__ == "__main__":
+    main()
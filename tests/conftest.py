@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+MOCK_YEARS = range(2020, 2025)
+
+
+@pytest.fixture(scope="session")
+def mock_cube():
+    """
+    :return: the count cube of 4000 mock records of every year of 2020-2024, not to be modified
+    """
+    from cube import build_cube
+    from mock_ckan import make_records
+    from preprocessing import add_categories, build_analytics_frame
+    from schema import apply_schema
+
+    frames = [add_categories(apply_schema(pd.DataFrame(make_records(year, 4000, first_id=year * 4000))))
+              for year in MOCK_YEARS]
+    return build_cube(build_analytics_frame(pd.concat(frames, ignore_index=True)))
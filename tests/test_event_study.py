@@ -0,0 +1,44 @@
+"""
+The many-events study against the single-event counts it batches.
+"""
+import numpy as np
+
+from event_study import event_study
+from event_window import AFTER, BEFORE, event_window_counts, normalize_by_quarters
+
+EVENTS = {"COVID lockdown": "2020-03-25", "7.10": "2023-10-07", "before the data": "2015-01-01"}
+
+
+def test_matches_every_single_event(mock_cube):
+    study = event_study(mock_cube, EVENTS, by=("Category",))
+    for event, date in EVENTS.items():
+        counts, quarters = event_window_counts(mock_cube, date, by=["Category"])
+        expected = normalize_by_quarters(counts, quarters).set_index(["Category", "Period"])
+        rows = study[study["Event"] == event].set_index(["Category", "Period"])
+        # the study has a row for every period, empty ones included
+        assert rows["Count"].sum() == mock_cube["Count"].sum()
+        joined = rows.join(expected, rsuffix="_single", how="left")
+        present = joined["Count_single"].notna()
+        assert (joined.loc[present, "Count"] == joined.loc[present, "Count_single"]).all()
+        assert (joined.loc[present, "NormalizedCount"] == joined.loc[present, "NormalizedCount_single"]).all()
+        assert (joined.loc[~present, "Count"] == 0).all()
+
+
+def test_quarters_on_each_side(mock_cube):
+    study = event_study(mock_cube, EVENTS, by=("Category",))
+    quarters = study.drop_duplicates(["Event", "Period"]).set_index(["Event", "Period"])["Quarters"]
+    # the mock data has every quarter of 2020-2024
+    assert quarters[("7.10", BEFORE)] == 15 and quarters[("7.10", AFTER)] == 5
+    assert quarters[("COVID lockdown", BEFORE)] == 0 and quarters[("COVID lockdown", AFTER)] == 20
+    assert quarters[("before the data", BEFORE)] == 0
+
+
+def test_districts_include_their_total(mock_cube):
+    study = event_study(mock_cube, {"7.10": "2023-10-07"})
+    rows = study[study["PoliceDistrict"] != "כל המחוזות"]
+    total = study[study["PoliceDistrict"] == "כל המחוזות"]
+    assert len(total)
+    np.testing.assert_array_equal(
+        rows.groupby(["Category", "Period"], observed=True)["Count"].sum().sort_index().to_numpy(),
+        total.set_index(["Category", "Period"])["Count"].sort_index().to_numpy(),
+    )
@@ -0,0 +1,43 @@
+"""
+Writing and pruning the map's datasets while other versions are being built.
+"""
+import os
+import time
+
+import pandas as pd
+
+from heatmap_data import KEEP_VERSIONS, _dataset_path, load_heatmap_dataset, write_heatmap_dataset
+from shared_store import FRAME_FORMAT
+
+HEATMAP = pd.DataFrame({"Year": pd.array([2023], dtype="int16"), "StatisticGroup": pd.Categorical(["x"]),
+                        "PoliceMerhav": pd.Categorical(["m"])})
+
+
+def test_keeps_the_last_versions_and_other_writers_files(tmp_path):
+    cache_dir = str(tmp_path)
+    in_progress = f"{_dataset_path('v0', cache_dir)}.tmp"
+    open(in_progress, "w").close()
+    stale = os.path.join(cache_dir, f"heatmap-f{FRAME_FORMAT - 1}-v1.parquet")
+    open(stale, "w").close()
+    for version in ("v1", "v2", "v3"):
+        write_heatmap_dataset(HEATMAP, version, cache_dir)
+        time.sleep(0.01)  # distinct mtimes
+
+    assert os.path.exists(in_progress)
+    assert not os.path.exists(stale)
+    kept = sorted(name for name in os.listdir(cache_dir) if name.endswith(".parquet"))
+    assert kept == [os.path.basename(_dataset_path(version, cache_dir)) for version in ("v2", "v3")]
+    assert len(kept) == KEEP_VERSIONS
+
+
+def test_builds_once_then_reads(tmp_path):
+    builds = []
+
+    def load_records():
+        builds.append(1)
+        return pd.DataFrame({"Year": [2023], "StatisticGroup": ["x"], "PoliceMerhav": ["מרחב ירושלים"]})
+
+    first = load_heatmap_dataset("v1", load_records, str(tmp_path))
+    second = load_heatmap_dataset("v1", load_records, str(tmp_path))
+    assert len(builds) == 1
+    pd.testing.assert_frame_equal(first, second)
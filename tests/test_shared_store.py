@@ -0,0 +1,47 @@
+"""
+Publishing and attaching the frames shared by the processes of a node.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from shared_store import FRAME_FORMAT, attach_frame, publish_frame, shared_frame
+
+
+def build_slowly(marker_dir):
+    # leaves a file per build, so the test can count them across processes
+    open(os.path.join(marker_dir, f"build-{os.getpid()}-{time.time()}"), "w").close()
+    time.sleep(0.3)
+    return pd.DataFrame({"x": range(1000)})
+
+
+def attach_or_build(shared_dir, marker_dir):
+    return int(shared_frame("frame", "v1", lambda: build_slowly(marker_dir), shared_dir)["x"].sum())
+
+
+def test_attach_returns_the_published_frame(tmp_path):
+    publish_frame("frame", "v1", pd.DataFrame({"x": [1, 2, 3]}), str(tmp_path))
+    assert attach_frame("frame", "v1", str(tmp_path))["x"].tolist() == [1, 2, 3]
+    assert attach_frame("frame", "v2", str(tmp_path)) is None
+
+
+def test_stale_format_is_rebuilt_and_dropped(tmp_path):
+    shared_dir = str(tmp_path)
+    publish_frame("frame", "v1", pd.DataFrame({"old": [1]}), shared_dir, frame_format=FRAME_FORMAT - 1)
+
+    df = shared_frame("frame", "v1", lambda: pd.DataFrame({"new": [2]}), shared_dir)
+    assert df.columns.tolist() == ["new"]
+    assert attach_frame("frame", "v1", shared_dir, frame_format=FRAME_FORMAT - 1) is None
+    assert len(os.listdir(shared_dir)) == 2  # the frame and its lock file
+
+
+def test_only_one_process_builds(tmp_path):
+    shared_dir, marker_dir = str(tmp_path / "shared"), str(tmp_path / "markers")
+    os.makedirs(marker_dir)
+    with ProcessPoolExecutor(max_workers=4, mp_context=multiprocessing.get_context("spawn")) as pool:
+        sums = list(pool.map(attach_or_build, [shared_dir] * 4, [marker_dir] * 4))
+    assert sums == [sum(range(1000))] * 4
+    assert len(os.listdir(marker_dir)) == 1
@@ -0,0 +1,93 @@
+"""
+The incremental refresh of the snapshot store, against the mock CKAN server.
+"""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import snapshot_store
+from mock_ckan import MockCkan, make_records
+from schema import apply_schema
+
+RESOURCE_ID = "live-year"
+YEAR = 2024
+
+
+@pytest.fixture
+def mock():
+    with MockCkan({RESOURCE_ID: make_records(YEAR, 1000)}) as mock:
+        yield mock
+
+
+@pytest.fixture
+def cache_dir(tmp_path, mock):
+    # the snapshot as it was last downloaded
+    records = mock.resources[RESOURCE_ID]
+    snapshot_store.write_snapshot(RESOURCE_ID, apply_schema(pd.DataFrame(records)), mock.last_modified[RESOURCE_ID],
+                                  str(tmp_path))
+    return str(tmp_path)
+
+
+def publish(mock, count):
+    # new records upstream, with the ids following the last one
+    records = mock.resources[RESOURCE_ID]
+    records += make_records(YEAR, count, seed=len(records), first_id=records[-1]["_id"] + 1)
+    mock.last_modified[RESOURCE_ID] = f"2024-06-01T00:00:{len(records) % 60:02d}"
+
+
+def snapshot_ids(cache_dir):
+    return snapshot_store.read_snapshot(RESOURCE_ID, cache_dir)["_id"].tolist()
+
+
+def test_unchanged_resource_isnt_fetched(mock, cache_dir):
+    assert snapshot_store.refresh_resource(RESOURCE_ID, cache_dir, mock.base_url) == 0
+    assert len(snapshot_ids(cache_dir)) == 1000
+
+
+def test_refresh_appends_only_new_records(mock, cache_dir):
+    publish(mock, 100)
+    assert snapshot_store.refresh_resource(RESOURCE_ID, cache_dir, mock.base_url) == 100
+    assert snapshot_ids(cache_dir) == [record["_id"] for record in mock.resources[RESOURCE_ID]]
+    assert len(snapshot_store.read_manifest(RESOURCE_ID, cache_dir)["files"]) == 2
+
+
+def test_concurrent_refreshes_dont_duplicate_records(mock, cache_dir):
+    publish(mock, 100)
+    mock.latency = 0.05  # so every refresh reads the manifest while another one fetches
+    new_records, errors = [], []
+
+    def refresh(delay):
+        time.sleep(delay)
+        try:
+            new_records.append(snapshot_store.refresh_resource(RESOURCE_ID, cache_dir, mock.base_url))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh, args=(i * 0.06,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sorted(new_records) == [0, 0, 0, 100]  # the others saw the first one's append
+    ids = snapshot_ids(cache_dir)
+    assert len(ids) == 1100
+    assert len(set(ids)) == len(ids)
+
+
+def test_append_drops_records_already_held(mock, cache_dir):
+    held = apply_schema(pd.DataFrame(mock.resources[RESOURCE_ID][-10:]))
+    snapshot_store.append_snapshot(RESOURCE_ID, held, "later", cache_dir)
+    assert len(snapshot_ids(cache_dir)) == 1000
+
+
+def test_delta_after_upstream_delete(mock, cache_dir):
+    # records held are deleted upstream before new ones arrive, so paging from
+    # the number of records held would skip as many new ones
+    del mock.resources[RESOURCE_ID][10:20]
+    publish(mock, 50)
+    snapshot_store.refresh_resource(RESOURCE_ID, cache_dir, mock.base_url)
+    assert snapshot_ids(cache_dir) == [record["_id"] for record in mock.resources[RESOURCE_ID]]
@@ -0,0 +1,67 @@
+"""
+The quarterly series' statistics, their incremental extension and the
+anomaly rule.
+"""
+import numpy as np
+import pandas as pd
+
+from timeseries import THRESHOLD, QuarterlySeries
+
+
+def stationary_series(quarters, cells, rate=500, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(rate, size=(quarters, cells, 1)).astype("int64")
+    index = pd.period_range("2000Q1", periods=quarters, freq="Q")
+    return QuarterlySeries(index, [f"c{i}" for i in range(cells)], [], counts)
+
+
+def test_counts_match_the_records(mock_cube):
+    series = QuarterlySeries.from_cube(mock_cube)
+    expected = mock_cube.groupby(["Year", "Quarter", "Category"], observed=True)["Count"].sum()
+    assert len(series.index) == 20
+    assert series.counts[:, :, 0].sum() == expected.sum()
+    period = series.index.get_loc(pd.Period("2023Q4"))
+    category = series.categories[0]
+    assert series.counts[period, 0, 0] == expected.loc[(2023, 4, category)]
+    # the total of every quarter is the sum of its districts
+    assert (series.counts[:, :, 0] == series.counts[:, :, 1:].sum(axis=2)).all()
+
+
+def test_extension_matches_full_recompute(mock_cube):
+    previous = QuarterlySeries.from_cube(mock_cube[mock_cube["Year"] < 2024])
+    extended = QuarterlySeries.from_cube(mock_cube, previous)
+    full = QuarterlySeries.from_cube(mock_cube)
+    assert extended.computed == 4  # only the new year's quarters
+    for name in ("counts", "rolling_mean", "yoy", "zscore"):
+        np.testing.assert_array_equal(getattr(extended, name), getattr(full, name))
+
+
+def test_revised_quarter_is_recomputed_from_there(mock_cube):
+    previous = QuarterlySeries.from_cube(mock_cube)
+    revised = mock_cube.copy()
+    revised.loc[(revised["Year"] == 2024) & (revised["Quarter"] == 3), "Count"] += 1
+    extended = QuarterlySeries.from_cube(revised, previous)
+    assert extended.computed == 2  # 2024-Q3 and 2024-Q4
+    np.testing.assert_array_equal(extended.zscore, QuarterlySeries.from_cube(revised).zscore)
+
+
+def test_false_positive_rate_of_stationary_series():
+    series = stationary_series(quarters=40, cells=5000)
+    scored = ~np.isnan(series.zscore)
+    rate = series.anomalies[scored].mean()
+    assert rate < 0.02
+
+
+def test_spike_is_flagged():
+    series = stationary_series(quarters=20, cells=1)
+    counts = series.counts.copy()
+    counts[-1] += 200  # about 9 standard deviations of the noise
+    spiked = QuarterlySeries(series.index, series.categories, [], counts)
+    assert spiked.anomalies[-1, 0, 0]
+    assert spiked.zscore[-1, 0, 0] > THRESHOLD
+
+
+def test_event_label():
+    series = stationary_series(quarters=20, cells=1)
+    assert series.event_label("2003-10-07") == "2003-Q4"
+    assert series.event_label("2023-10-07") is None
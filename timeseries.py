@@ -0,0 +1,174 @@
+"""
+Quarterly time series of the counts of every category and district, with their
+rolling statistics.
+
+The counts are a dense int64 array of shape (quarters, categories, districts + 1),
+on a quarterly PeriodIndex without gaps, where district 0 is the total of all
+the districts. Every quarter's statistics depend only on it and the quarters
+before it:
+
+    rolling mean  the mean of the last WINDOW quarters
+    yoy           the change from the same quarter a year earlier
+    zscore        the distance from the mean of the BASELINE quarters before
+                  it, in standard deviations of a new quarter's prediction
+                  interval, std * sqrt(1 + 1/n). Beyond THRESHOLD the quarter
+                  is flagged as an anomaly.
+
+The baseline is long and the threshold high on purpose: against a few quarters,
+a z-score beyond 2 flags about one quarter in ten of pure noise, and with these
+settings about one in a hundred.
+
+So when a new data version adds quarters, or revises the last ones, the series
+is extended from the previous version's: its statistics are kept up to the
+first quarter whose counts changed and only the rest are computed.
+"""
+import numpy as np
+import pandas as pd
+
+from event_window import quarter_keys
+
+WINDOW = 4  # quarters of the rolling mean
+YEAR = 4  # quarters in a year, the lag of the year-over-year change
+BASELINE = 12  # quarters before a quarter that its z-score is measured against
+MIN_BASELINE = 8  # quarters needed before a quarter for its z-score
+THRESHOLD = 3.0  # absolute z-score of an anomaly
+
+
+def dense_counts(cube, categories, districts):
+    """
+    :param cube: a cube with Year, Quarter, Category and PoliceDistrict dimensions
+    :param categories: the categories, in the order of the array
+    :param districts: the districts, in the order of the array
+    :return: (quarterly PeriodIndex, int64 array of the counts of every quarter,
+    category and district, district 0 being their total)
+    """
+    keys = quarter_keys(cube["Year"], cube["Quarter"])
+    if not len(keys):
+        return pd.PeriodIndex([], freq="Q"), np.zeros((0, len(categories), len(districts) + 1), dtype="int64")
+    first = int(keys.min())
+    index = pd.period_range(pd.Period(year=first // 4, quarter=first % 4 + 1, freq="Q"),
+                            periods=int(keys.max()) - first + 1, freq="Q")
+    category = pd.Categorical(cube["Category"], categories=categories).codes
+    district = pd.Categorical(cube["PoliceDistrict"], categories=districts).codes
+    positions, values = keys - first, cube["Count"].to_numpy()
+    counts = np.zeros((len(index), len(categories), len(districts) + 1), dtype="int64")
+    known = category >= 0  # records without a category aren't drawn
+    np.add.at(counts[:, :, 0], (positions[known], category[known]), values[known])
+    # records without a district count in the total only
+    known &= district >= 0
+    np.add.at(counts, (positions[known], category[known], district[known] + 1), values[known])
+    return index, counts
+
+
+class QuarterlySeries:
+    """
+    The quarterly counts of every category and district and their rolling
+    statistics, read-only once built
+    """
+
+    def __init__(self, index, categories, districts, counts, previous=None):
+        """
+        :param index: quarterly PeriodIndex of the counts
+        :param categories: the categories of the counts' second axis
+        :param districts: the districts of the counts' third axis, after their total
+        :param counts: int64 array from dense_counts
+        :param previous: the series of an earlier data version, whose statistics
+        are kept up to the first quarter that changed
+        """
+        self.index = index
+        self.categories = list(categories)
+        self.districts = list(districts)
+        self.counts = counts
+        self.rolling_mean = np.full(counts.shape, np.nan)
+        self.yoy = np.full(counts.shape, np.nan)
+        self.zscore = np.full(counts.shape, np.nan)
+        self.computed = 0  # quarters whose statistics were computed rather than kept
+
+        start = 0
+        if previous is not None and self._extends(previous):
+            start = self._first_change(previous)
+            for name in ("rolling_mean", "yoy", "zscore"):
+                getattr(self, name)[:start] = getattr(previous, name)[:start]
+        self._compute(start)
+
+    @classmethod
+    def from_cube(cls, cube, previous=None):
+        """
+        :param cube: a cube with Year, Quarter, Category and PoliceDistrict dimensions
+        :param previous: the series of an earlier data version, or None
+        :return: the series of the cube
+        """
+        categories = sorted(cube["Category"].dropna().unique())
+        districts = sorted(cube["PoliceDistrict"].dropna().unique())
+        index, counts = dense_counts(cube, categories, districts)
+        return cls(index, categories, districts, counts, previous)
+
+    def _extends(self, previous):
+        return (previous.categories == self.categories and previous.districts == self.districts
+                and len(previous.index) and len(self.index) and previous.index[0] == self.index[0])
+
+    def _first_change(self, previous):
+        common = min(len(previous.index), len(self.index))
+        changed = np.flatnonzero((previous.counts[:common] != self.counts[:common]).any(axis=(1, 2)))
+        return int(changed[0]) if len(changed) else common
+
+    def _compute(self, start):
+        counts = self.counts.astype("float64")
+        for t in range(start, len(self.index)):
+            if t + 1 >= WINDOW:
+                self.rolling_mean[t] = counts[t + 1 - WINDOW:t + 1].mean(axis=0)
+            if t >= YEAR:
+                self.yoy[t] = counts[t] - counts[t - YEAR]
+            if t >= MIN_BASELINE:
+                baseline = counts[max(0, t - BASELINE):t]
+                std = baseline.std(axis=0, ddof=1) * np.sqrt(1 + 1 / len(baseline))
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    self.zscore[t] = np.where(std > 0, (counts[t] - baseline.mean(axis=0)) / std, np.nan)
+        self.computed = len(self.index) - start
+
+    @property
+    def anomalies(self):
+        """
+        :return: bool array of the quarters whose absolute z-score is beyond THRESHOLD
+        """
+        return np.abs(np.nan_to_num(self.zscore)) > THRESHOLD
+
+    def labels(self):
+        """
+        :return: the quarters as labels like 2023-Q4
+        """
+        return [f"{period.year}-Q{period.quarter}" for period in self.index]
+
+    def event_label(self, date):
+        """
+        :param date: a date, or anything pd.Period accepts
+        :return: label of the date's quarter, or None if it is outside the series
+        """
+        period = pd.Period(date, freq="Q")
+        return f"{period.year}-Q{period.quarter}" if period in self.index else None
+
+    def frame(self, categories=None, district=None):
+        """
+        :param categories: the categories to keep, all by default
+        :param district: a district, or None for all of them
+        :return: pandas df of the Quarter, Category, Count, RollingMean, YoY,
+        ZScore and Anomaly of every quarter of every category
+        """
+        if categories is not None:
+            wanted = set(categories)
+            categories = [category for category in self.categories if category in wanted]
+        else:
+            categories = self.categories
+        rows = [self.categories.index(category) for category in categories]
+        column = 0 if district is None else self.districts.index(district) + 1
+        quarters, n = self.labels(), len(self.index)
+        return pd.DataFrame({
+            "Quarter": np.tile(quarters, len(rows)),
+            "Category": np.repeat(categories, n),
+            "Count": self.counts[:, rows, column].T.ravel(),
+            "RollingMean": self.rolling_mean[:, rows, column].T.ravel(),
+            "YoY": self.yoy[:, rows, column].T.ravel(),
+            "ZScore": self.zscore[:, rows, column].T.ravel(),
+            "Anomaly": self.anomalies[:, rows, column].T.ravel(),
+        })
+